@@ -0,0 +1,87 @@
+"""
+Accuracy and cost of the sketched median of the StateEncoder top-tier ranking.
+
+For each relative accuracy, fits a StateEncoder with median_sketch_accuracy
+and compares its top-10 state list with the one of the exact median. Also
+reports the largest relative error of the per-state medians, the largest
+sketch (entries per state) and the fit time, next to the relative price gap
+between the 10th and 11th state: the lists are guaranteed to match when that
+gap exceeds twice the accuracy.
+
+Runs on the real training split (dataset/projectA_vehicle_train.csv, through
+src.data.cache) with --real, and on synthetic listings otherwise.
+
+Usage:
+    python -m benchmarks.median_sketch --real
+    python -m benchmarks.median_sketch --rows 1000000
+"""
+
+import argparse
+import time
+
+import polars as pl
+
+from src.config.preprocess import PreprocessorConfig
+from src.data.cache import load_split
+from src.data.synthetic import generate_listings
+from src.features.state import StateEncoder
+from src.features.stats import price_window_expr
+
+DEFAULT_ACCURACIES = [0.05, 0.01, 0.005, 0.001, 0.0001]
+
+
+def _fit(df: pl.DataFrame, accuracy: float | None) -> tuple[StateEncoder, float]:
+    config = PreprocessorConfig().to_dict()["state_encoder_config"]
+    config["median_sketch_accuracy"] = accuracy
+    encoder = StateEncoder(**config)
+    start = time.perf_counter()
+    encoder.fit(df.select("state"), df.select("price"))
+    return encoder, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--real", action="store_true", help="use the real data")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--accuracy", type=float, nargs="+", default=DEFAULT_ACCURACIES)
+    args = parser.parse_args()
+
+    if args.real:
+        df = load_split("train", columns=["state", "price"])
+    else:
+        df = generate_listings(args.rows).select("state", "price")
+    config = PreprocessorConfig()
+    df = df.filter(
+        price_window_expr(config.price_lower_bound, config.price_upper_bound)
+    )
+
+    exact, exact_seconds = _fit(df, None)
+    medians = exact.stats_.sort(["median", "category"], descending=[True, False])
+    tenth, eleventh = medians.get_column("median").slice(9, 2).to_list()
+    print(f"rows: {df.height:,}, states: {exact.stats_.height}")
+    print(f"gap between 10th and 11th state: {(tenth - eleventh) / tenth:.4%}")
+    print(f"exact median: {exact_seconds:.4f} s, top 10: {exact.top_states_}")
+
+    print(
+        f"{'accuracy':>10} {'top 10 match':>13} {'max rel err':>12} "
+        f"{'max sketch':>11} {'time [s]':>9}"
+    )
+    for accuracy in args.accuracy:
+        sketched, seconds = _fit(df, accuracy)
+        errors = sketched.stats_.join(
+            exact.stats_, on="category", nulls_equal=True, suffix="_exact"
+        ).select(
+            ((pl.col("median") - pl.col("median_exact")).abs() / pl.col("median_exact"))
+            .max()
+            .alias("error")
+        )
+        print(
+            f"{accuracy:>10g} {str(sketched.top_states_ == exact.top_states_):>13} "
+            f"{errors.item():>12.2e} "
+            f"{sketched.stats_.get_column('sketch').list.len().max():>11} "
+            f"{seconds:>9.4f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Latency benchmark for single-record scoring.
+
+Compares the one-row DataFrame path through Preprocessor.transform with the
+precompiled RecordScorer, reporting p50/p99 latency in microseconds.
+
+Usage:
+    python -m benchmarks.record_scoring
+"""
+
+import time
+
+import lightgbm as lgb
+import numpy as np
+import polars as pl
+
+from src.config.preprocess import PreprocessorConfig
+from src.data.synthetic import generate_listings
+from src.features.matrix import FeatureMatrix
+from src.features.preprocess import Preprocessor
+from src.scoring.record import RecordScorer
+
+
+def _latencies_us(fn, records: list[dict]) -> np.ndarray:
+    latencies = np.empty(len(records))
+    for i, record in enumerate(records):
+        start = time.perf_counter_ns()
+        fn(record)
+        latencies[i] = (time.perf_counter_ns() - start) / 1_000
+    return latencies
+
+
+def main(n_records: int = 2_000) -> None:
+    train_df = generate_listings(50_000)
+    preprocessor = Preprocessor(**PreprocessorConfig().to_dict()).fit(train_df)
+    train_matrix = FeatureMatrix.from_frame(
+        preprocessor.transform(train_df), label="price"
+    )
+    booster = lgb.train(
+        {"objective": "regression", "verbosity": -1},
+        train_matrix.to_dataset(),
+        num_boost_round=100,
+    )
+    scorer = RecordScorer(preprocessor, booster)
+    records = list(generate_listings(n_records, seed=1).iter_rows(named=True))
+
+    def dataframe_path(record: dict) -> float:
+        df = pl.DataFrame([record], schema=train_df.schema)
+        x = preprocessor.transform(df, add_noise=False).select(booster.feature_name())
+        return booster.predict(x.to_numpy())[0]
+
+    print(f"{'path':<28} {'p50 [us]':>10} {'p99 [us]':>10}")
+    for name, fn in [
+        ("DataFrame + transform", dataframe_path),
+        ("RecordScorer.features", scorer.features),
+        ("RecordScorer.predict", scorer.predict),
+    ]:
+        fn(records[0])  # warm up
+        latencies = _latencies_us(fn, records)
+        p50, p99 = np.percentile(latencies, [50, 99])
+        print(f"{name:<28} {p50:>10.1f} {p99:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Benchmark suite of the preprocessing pipeline and the LightGBM handoff.
+
+Times, on synthetic listings (src.data.synthetic) of growing size:
+- fit and transform of every encoder of the Preprocessor
+- TargetEncoder fit and transform
+- Preprocessor.run
+- LightGBM train and predict through FeatureMatrix
+
+Every measurement is printed and appended to the output file as one JSON
+object per line, together with the environment (git commit, library versions,
+CPU count), so that throughput and scaling curves can be compared across
+versions.
+
+Usage:
+    python -m benchmarks.suite --rows 10000 100000 1000000 --output bench.jsonl
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from collections.abc import Callable, Iterator
+from datetime import datetime, timezone
+
+import lightgbm as lgb
+import numpy as np
+import polars as pl
+
+from src.config.preprocess import PreprocessorConfig
+from src.data.synthetic import generate_splits
+from src.features.matrix import FeatureMatrix
+from src.features.preprocess import Preprocessor
+from src.features.target_encoding import TargetEncoder
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+LGB_PARAMS = {"objective": "regression", "verbosity": -1, "seed": 0}
+
+
+def _time(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> dict:
+    """Description of the code and machine the benchmarks run on."""
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "polars": pl.__version__,
+        "numpy": np.__version__,
+        "lightgbm": lgb.__version__,
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_benchmarks(
+    n_rows: int, repeat: int = 3, num_boost_round: int = 100
+) -> Iterator[tuple[str, str, float]]:
+    """
+    Run every benchmark on a synthetic dataset of n_rows training listings.
+
+    Yields:
+        tuple[str, str, float]: Benchmark name, target and best time in seconds
+    """
+    train_df, val_df, test_df = generate_splits(n_rows, seed=0)
+    config = PreprocessorConfig().to_dict()
+
+    # エンコーダーごとの fit / transform（外れ値除去後の学習データ）
+    preprocessor = Preprocessor(**config)
+    train_excluded = preprocessor._remove_outliers(
+        train_df, preprocessor.price_upper_bound, preprocessor.price_lower_bound
+    )
+    y = train_excluded.select("price")
+    for col, encoder in preprocessor.encoders.items():
+        X = train_excluded.select(col)
+        yield "encoder.fit", col, _time(lambda: encoder.fit(X, y), repeat)
+        yield "encoder.transform", col, _time(lambda: encoder.transform(X), repeat)
+
+    # TargetEncoder 単体
+    category = train_excluded.get_column("manufacturer")
+    target = train_excluded.get_column("price")
+    target_encoder = TargetEncoder().fit(category, target)
+    yield (
+        "target_encoder.fit",
+        "manufacturer",
+        _time(lambda: TargetEncoder().fit(category, target), repeat),
+    )
+    yield (
+        "target_encoder.transform",
+        "manufacturer",
+        _time(lambda: target_encoder.transform(category), repeat),
+    )
+
+    # 前処理パイプライン全体
+    yield (
+        "preprocessor.run",
+        "default",
+        _time(lambda: Preprocessor(**config).run(train_df, val_df, test_df), repeat),
+    )
+
+    # LightGBM の学習と予測
+    train_out, val_out, _ = Preprocessor(**config).run(train_df, val_df, test_df)
+    train_matrix = FeatureMatrix.from_frame(train_out, label="price")
+    val_matrix = FeatureMatrix.from_frame(val_out)
+    yield (
+        "feature_matrix.from_frame",
+        "train",
+        _time(lambda: FeatureMatrix.from_frame(train_out, label="price"), repeat),
+    )
+
+    def train() -> lgb.Booster:
+        return lgb.train(
+            LGB_PARAMS, train_matrix.to_dataset(), num_boost_round=num_boost_round
+        )
+
+    booster = train()
+    yield f"lightgbm.train[{num_boost_round}]", "train", _time(train, 1)
+    yield "lightgbm.predict", "val", _time(lambda: val_matrix.predict(booster), repeat)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--num-boost-round", type=int, default=100)
+    parser.add_argument("--output", help="JSON lines file the results are appended to")
+    args = parser.parse_args()
+
+    env = environment()
+    print(
+        f"{'benchmark':<28} {'target':<14} {'rows':>12} {'time [s]':>10} {'rows/s':>14}"
+    )
+    for n_rows in args.rows:
+        results = run_benchmarks(n_rows, args.repeat, args.num_boost_round)
+        for benchmark, target, seconds in results:
+            record = {
+                "benchmark": benchmark,
+                "target": target,
+                "rows": n_rows,
+                "seconds": seconds,
+                "rows_per_second": n_rows / seconds,
+                **env,
+            }
+            print(
+                f"{benchmark:<28} {target:<14} {n_rows:>12,} {seconds:>10.4f} "
+                f"{n_rows / seconds:>14,.0f}"
+            )
+            if args.output:
+                with open(args.output, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark for TargetEncoder.fit and TargetEncoder.transform.
+
+Compares the single-pass group_by fit against the previous per-category
+mask loop while growing the row count and the number of categories, and
+the table-lookup transform against the previous per-row dict lookup.
+
+Usage:
+    python -m benchmarks.target_encoding
+"""
+
+import time
+
+import numpy as np
+import polars as pl
+
+from src.features.target_encoding import TargetEncoder
+
+
+def _legacy_fit(X: np.ndarray, y: np.ndarray) -> dict:
+    """Previous O(n·k) implementation, kept here as the baseline."""
+    global_mean = np.mean(y)
+    encoding_map = {}
+    for category in np.unique(X):
+        category_values = y[X == category]
+        category_count = len(category_values)
+        encoding_map[category] = (
+            category_count * np.mean(category_values) + global_mean
+        ) / (category_count + 1.0)
+    return encoding_map
+
+
+def _legacy_transform(X: np.ndarray, encoding_map: dict, global_mean: float):
+    """Previous per-row dict lookup, kept here as the baseline."""
+    return np.array(
+        [encoding_map.get(category, global_mean) for category in X], dtype=float
+    )
+
+
+def _make_data(n_rows: int, n_categories: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    categories = np.array([f"cat_{i}" for i in range(n_categories)], dtype=object)
+    X = categories[rng.integers(0, n_categories, size=n_rows)]
+    y = rng.lognormal(9.5, 0.8, size=n_rows)
+    return X, y
+
+
+def _time(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_fit() -> None:
+    print(
+        f"{'rows':>10} {'categories':>10} {'legacy [s]':>12} {'fit [s]':>10} {'speedup':>8}"
+    )
+    for n_rows in [100_000, 1_000_000]:
+        for n_categories in [10, 50, 500]:
+            X, y = _make_data(n_rows, n_categories)
+            encoder = TargetEncoder(smoothing=1.0, min_samples_leaf=1)
+
+            legacy = _time(lambda: _legacy_fit(X, y))
+            current = _time(lambda: encoder.fit(X, y))
+
+            # 同じエンコーディングになることを確認
+            expected = _legacy_fit(X, y)
+            actual = encoder.category_encoding_map
+            assert expected.keys() == actual.keys()
+            assert np.allclose(
+                [expected[k] for k in expected], [actual[k] for k in expected]
+            )
+
+            print(
+                f"{n_rows:>10,} {n_categories:>10,} {legacy:>12.4f} "
+                f"{current:>10.4f} {legacy / current:>7.1f}x"
+            )
+
+
+def bench_transform() -> None:
+    print(f"{'rows':>10} {'legacy [s]':>12} {'transform [s]':>14} {'speedup':>8}")
+    for n_rows in [1_000_000, 10_000_000]:
+        X, y = _make_data(n_rows, 50)
+        encoder = TargetEncoder(noise_level=0.0).fit(X, y)
+        encoding_map = encoder.category_encoding_map
+        # エンコーダーからは pl.Series のまま渡される
+        X_series = pl.Series(X)
+
+        legacy = _time(
+            lambda: _legacy_transform(X, encoding_map, encoder.global_mean), repeat=1
+        )
+        current = _time(lambda: encoder.transform(X_series))
+
+        assert np.allclose(
+            _legacy_transform(X[:1000], encoding_map, encoder.global_mean),
+            encoder.transform(X[:1000]),
+        )
+
+        print(
+            f"{n_rows:>10,} {legacy:>12.4f} {current:>14.4f} {legacy / current:>7.1f}x"
+        )
+
+
+def main() -> None:
+    bench_fit()
+    print()
+    bench_transform()
+
+
+if __name__ == "__main__":
+    main()
@@ -161,6 +161,15 @@ class StateEncoderConfig(BaseModel):
     target_encoder_config: Optional[TargetEncoderConfig] = Field(
         default_factory=TargetEncoderConfig
     )
+    median_sketch_accuracy: Optional[float] = Field(
+        default=None,
+        gt=0,
+        lt=1,
+        description=(
+            "Relative accuracy of the quantile sketch approximating the median "
+            "price of the top tier ranking (exact median if None)."
+        ),
+    )
 
     class Config:
         validate_assignment = True
@@ -0,0 +1,193 @@
+"""
+Columnar cache of the vehicle listing datasets.
+
+The CSV files are parsed once into uncompressed Arrow IPC files with a fixed
+schema. Later loads memory-map the IPC file and read only the requested
+columns. A cache entry is rebuilt when its source CSV changes (size or
+modification time) or when the cache format changes.
+
+Optionally the categorical columns are loaded as pl.Enum, with the vocabulary
+of the training split (see src.data.schema).
+"""
+
+import json
+import os
+from pathlib import Path
+
+import polars as pl
+
+from src.data.schema import (
+    build_vocabulary,
+    cast_categoricals,
+    load_vocabulary,
+    save_vocabulary,
+)
+
+DATASET_DIR = Path(__file__).resolve().parents[2] / "dataset"
+SPLITS = ("train", "val", "test")
+
+POSTING_DATE_FORMAT = "%Y-%m-%d %H:%M:%S%z"
+
+# Fixed schema of the listing datasets, in file order
+SCHEMA = {
+    "id": pl.Int64,
+    "price": pl.Int64,
+    "year": pl.Float64,
+    "manufacturer": pl.String,
+    "condition": pl.String,
+    "cylinders": pl.String,
+    "fuel": pl.String,
+    "odometer": pl.Float64,
+    "transmission": pl.String,
+    "drive": pl.String,
+    "type": pl.String,
+    "paint_color": pl.String,
+    "state": pl.String,
+    "posting_date": pl.Datetime("us", "UTC"),
+}
+
+# Columns used by the models (everything but the identifiers)
+FEATURE_COLUMNS = [col for col in SCHEMA if col not in ("id", "posting_date")]
+
+# Bump when SCHEMA or the parsing changes, to invalidate existing caches
+CACHE_FORMAT_VERSION = 1
+
+
+def csv_path(split: str, dataset_dir: Path = DATASET_DIR) -> Path:
+    """Path of the source CSV of a split."""
+    return Path(dataset_dir) / f"projectA_vehicle_{split}.csv"
+
+
+def read_csv(path: str | Path) -> pl.DataFrame:
+    """Parse a listing CSV into the fixed schema."""
+    schema_overrides = {**SCHEMA, "posting_date": pl.String}
+    return pl.read_csv(path, schema_overrides=schema_overrides).select(
+        *[
+            pl.col(col).cast(dtype)
+            for col, dtype in SCHEMA.items()
+            if col != "posting_date"
+        ],
+        pl.col("posting_date").str.strptime(pl.Datetime, POSTING_DATE_FORMAT),
+    )
+
+
+def _source_fingerprint(path: Path) -> dict:
+    stat = path.stat()
+    return {
+        "source": str(path.resolve()),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "format_version": CACHE_FORMAT_VERSION,
+    }
+
+
+def _cache_dir(dataset_dir: Path, cache_dir: Path | None) -> Path:
+    return Path(cache_dir) if cache_dir is not None else Path(dataset_dir) / ".cache"
+
+
+def cached_path(
+    split: str, dataset_dir: Path = DATASET_DIR, cache_dir: Path | None = None
+) -> Path:
+    """
+    Return the IPC cache file of a split, (re)building it if it is stale.
+
+    Args:
+        split: One of "train", "val" and "test"
+        dataset_dir: Directory containing the source CSV files
+        cache_dir: Directory of the cache files (dataset_dir/.cache by default)
+
+    Returns:
+        Path: Up-to-date Arrow IPC file of the split
+    """
+    source = csv_path(split, dataset_dir)
+    cache_dir = _cache_dir(dataset_dir, cache_dir)
+    ipc_path = cache_dir / f"{split}.arrow"
+    meta_path = cache_dir / f"{split}.json"
+
+    fingerprint = _source_fingerprint(source)
+    if ipc_path.exists() and meta_path.exists():
+        with open(meta_path, "r", encoding="utf-8") as f:
+            if json.load(f) == fingerprint:
+                return ipc_path
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first so that a concurrent reader never sees
+    # a partially written cache
+    tmp_path = ipc_path.with_suffix(f".arrow.{os.getpid()}.tmp")
+    read_csv(source).write_ipc(tmp_path, compression="uncompressed")
+    os.replace(tmp_path, ipc_path)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(fingerprint, f)
+
+    return ipc_path
+
+
+def vocabulary(
+    dataset_dir: Path = DATASET_DIR, cache_dir: Path | None = None
+) -> dict[str, list[str]]:
+    """
+    Return the categorical vocabulary of the training split.
+
+    The vocabulary is cached next to the split caches and rebuilt together
+    with the training split cache.
+
+    Args:
+        dataset_dir: Directory containing the source CSV files
+        cache_dir: Directory of the cache files (dataset_dir/.cache by default)
+
+    Returns:
+        dict[str, list[str]]: Vocabulary per categorical column
+    """
+    ipc_path = cached_path("train", dataset_dir, cache_dir)
+    vocab_path = _cache_dir(dataset_dir, cache_dir) / "vocabulary.json"
+    if vocab_path.exists() and vocab_path.stat().st_mtime_ns >= (
+        ipc_path.stat().st_mtime_ns
+    ):
+        return load_vocabulary(vocab_path)
+
+    vocab = build_vocabulary(pl.scan_ipc(ipc_path))
+    tmp_path = vocab_path.with_suffix(f".json.{os.getpid()}.tmp")
+    save_vocabulary(vocab, tmp_path)
+    os.replace(tmp_path, vocab_path)
+    return vocab
+
+
+def load_split(
+    split: str,
+    columns: list[str] | None = None,
+    dataset_dir: Path = DATASET_DIR,
+    cache_dir: Path | None = None,
+    categorical: bool = False,
+) -> pl.DataFrame:
+    """
+    Load one split from the cache, memory-mapped and column-projected.
+
+    Args:
+        split: One of "train", "val" and "test"
+        columns: Columns to load (all columns if None)
+        dataset_dir: Directory containing the source CSV files
+        cache_dir: Directory of the cache files (dataset_dir/.cache by default)
+        categorical: Whether to load the categorical columns as pl.Enum
+
+    Returns:
+        pl.DataFrame: The split with the fixed schema
+    """
+    path = cached_path(split, dataset_dir, cache_dir)
+    df = pl.read_ipc(path, columns=columns, memory_map=True)
+    if categorical:
+        df = cast_categoricals(df, vocabulary(dataset_dir, cache_dir))
+    return df
+
+
+def load_splits(
+    columns: list[str] | None = None,
+    dataset_dir: Path = DATASET_DIR,
+    cache_dir: Path | None = None,
+    categorical: bool = False,
+) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """Load the train, validation and test splits (see load_split)."""
+    train_df, val_df, test_df = (
+        load_split(split, columns, dataset_dir, cache_dir, categorical)
+        for split in SPLITS
+    )
+    return train_df, val_df, test_df
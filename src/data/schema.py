@@ -0,0 +1,98 @@
+"""
+Categorical schema of the listing datasets.
+
+The categorical columns are loaded as pl.Enum with a fixed vocabulary per
+column, taken from the training split. Their values are stored as UInt32
+codes, and the encoders work on those codes (see BaseEncoder.encode_exprs).
+Values missing from the vocabulary are mapped to the UNKNOWN_CATEGORY
+bucket, and nulls stay null.
+"""
+
+import json
+from pathlib import Path
+
+import polars as pl
+
+CATEGORICAL_COLUMNS = [
+    "manufacturer",
+    "condition",
+    "cylinders",
+    "fuel",
+    "transmission",
+    "drive",
+    "type",
+    "paint_color",
+    "state",
+]
+
+# Bucket of the values not seen when the vocabulary was built
+UNKNOWN_CATEGORY = "__unknown__"
+
+
+def build_vocabulary(df: pl.DataFrame | pl.LazyFrame) -> dict[str, list[str]]:
+    """
+    Collect the vocabulary of every categorical column.
+
+    Args:
+        df: Frame to take the vocabulary from (the training split)
+
+    Returns:
+        dict[str, list[str]]: Sorted non-null values per column, followed by
+        UNKNOWN_CATEGORY
+    """
+    columns = [col for col in CATEGORICAL_COLUMNS if col in df.collect_schema()]
+    uniques = (
+        df.lazy()
+        .select(pl.col(col).drop_nulls().unique().sort().implode() for col in columns)
+        .collect()
+    )
+    return {
+        col: [value for value in uniques.item(0, col) if value != UNKNOWN_CATEGORY]
+        + [UNKNOWN_CATEGORY]
+        for col in columns
+    }
+
+
+def enum_schema(vocabulary: dict[str, list[str]]) -> dict[str, pl.Enum]:
+    """Enum dtype of every column of the vocabulary."""
+    return {col: pl.Enum(values) for col, values in vocabulary.items()}
+
+
+def cast_categoricals(
+    df: pl.DataFrame | pl.LazyFrame, vocabulary: dict[str, list[str]]
+) -> pl.DataFrame | pl.LazyFrame:
+    """
+    Cast the categorical columns to their Enum dtype.
+
+    Args:
+        df: Frame with String categorical columns
+        vocabulary: Output of build_vocabulary
+
+    Returns:
+        pl.DataFrame | pl.LazyFrame: The frame with Enum categorical columns
+    """
+    schema = df.collect_schema()
+    exprs = []
+    for col, values in vocabulary.items():
+        if col not in schema or isinstance(schema[col], pl.Enum):
+            continue
+        exprs.append(
+            pl.when(pl.col(col).is_in(values) | pl.col(col).is_null())
+            .then(pl.col(col))
+            .otherwise(pl.lit(UNKNOWN_CATEGORY))
+            .cast(pl.Enum(values))
+            .alias(col)
+        )
+    return df.with_columns(exprs)
+
+
+def save_vocabulary(vocabulary: dict[str, list[str]], path: str | Path) -> None:
+    """Write a vocabulary to a JSON file."""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(vocabulary, f, ensure_ascii=False, indent=2)
+
+
+def load_vocabulary(path: str | Path) -> dict[str, list[str]]:
+    """Read a vocabulary written by save_vocabulary."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
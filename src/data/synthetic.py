@@ -0,0 +1,214 @@
+"""
+Synthetic vehicle listings with the schema of the real datasets.
+
+The real listings cannot be shared, so benchmarks and experiments run on
+generated data instead. Every column of src.data.cache.SCHEMA is produced with
+the vocabulary, skew and missing rate of the real data, and the price depends
+on the year, the odometer and several categorical columns (plus a small share
+of absurd prices), so the encoders and the models see realistic structure.
+
+Rows are generated chunk by chunk with one seeded generator per chunk, so sizes
+from 10k up to tens of millions of rows can be produced (or written to Parquet
+chunk by chunk) without intermediate arrays for the whole frame. The output is
+deterministic for a given seed and chunk size.
+"""
+
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import pyarrow.parquet as pq
+
+from src.data.cache import SCHEMA
+
+# Rows generated per chunk
+CHUNK_SIZE = 1_000_000
+
+MANUFACTURERS = [
+    "ford", "chevrolet", "toyota", "honda", "nissan", "jeep", "ram", "gmc",
+    "dodge", "bmw", "hyundai", "subaru", "mercedes-benz", "volkswagen", "kia",
+    "lexus", "chrysler", "cadillac", "buick", "mazda", "audi", "acura",
+    "infiniti", "lincoln", "pontiac", "volvo", "mitsubishi", "mini", "mercury",
+    "rover", "saturn", "jaguar", "fiat", "tesla", "porsche", "alfa-romeo",
+    "harley-davidson", "datsun", "aston-martin", "land rover", "ferrari",
+]  # fmt: skip
+CONDITIONS = ["good", "excellent", "like new", "fair", "new", "salvage"]
+CYLINDERS = [
+    "6 cylinders", "4 cylinders", "8 cylinders", "5 cylinders", "10 cylinders",
+    "other", "3 cylinders", "12 cylinders",
+]  # fmt: skip
+FUELS = ["gas", "diesel", "other", "hybrid", "electric"]
+TRANSMISSIONS = ["automatic", "other", "manual"]
+DRIVES = ["4wd", "fwd", "rwd"]
+TYPES = [
+    "sedan", "SUV", "pickup", "truck", "other", "coupe", "hatchback", "wagon",
+    "van", "convertible", "mini-van", "offroad", "bus",
+]  # fmt: skip
+PAINT_COLORS = [
+    "white", "black", "silver", "blue", "grey", "red", "green", "custom",
+    "brown", "yellow", "orange", "purple",
+]  # fmt: skip
+STATES = [
+    "ca", "fl", "tx", "ny", "oh", "or", "mi", "nc", "wa", "pa", "wi", "tn",
+    "co", "il", "va", "id", "nj", "az", "ia", "ma", "mn", "ga", "ok", "sc",
+    "mt", "ks", "in", "ct", "al", "md", "nm", "ky", "ak", "mo", "ar", "ut",
+    "dc", "la", "nv", "me", "hi", "vt", "ri", "nh", "ms", "ne", "sd", "de",
+    "wv", "nd", "wy",
+]  # fmt: skip
+
+# (vocabulary, Zipf exponent of the frequencies, share of missing values)
+CATEGORICAL_SPECS = {
+    "manufacturer": (MANUFACTURERS, 1.1, 0.04),
+    "condition": (CONDITIONS, 1.3, 0.40),
+    "cylinders": (CYLINDERS, 1.4, 0.42),
+    "fuel": (FUELS, 2.5, 0.01),
+    "transmission": (TRANSMISSIONS, 2.5, 0.01),
+    "drive": (DRIVES, 0.5, 0.31),
+    "type": (TYPES, 0.9, 0.22),
+    "paint_color": (PAINT_COLORS, 0.9, 0.30),
+    "state": (STATES, 0.9, 0.0),
+}
+
+# Share of listings with an absurd price (0, 1, 123456789, ...)
+ABSURD_PRICE_RATE = 0.01
+ABSURD_PRICES = np.array([0, 1, 10, 1234, 123456789, 1111111111])
+
+POSTING_START_US = int(datetime(2021, 4, 4, tzinfo=timezone.utc).timestamp() * 1e6)
+POSTING_SECONDS = 31 * 24 * 3600
+
+
+def _frequencies(n_categories: int, exponent: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n_categories + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _price_effects(n_categories: int, seed: int) -> np.ndarray:
+    # カテゴリごとの価格への寄与（対数スケール）。語彙ごとに固定
+    return np.random.default_rng(seed).normal(0.0, 0.25, size=n_categories)
+
+
+def _categorical(
+    rng: np.random.Generator, n_rows: int, n_categories: int, exponent: float
+) -> np.ndarray:
+    return rng.choice(n_categories, size=n_rows, p=_frequencies(n_categories, exponent))
+
+
+def generate_chunk(n_rows: int, seed: int = 0, id_offset: int = 0) -> pl.DataFrame:
+    """
+    Generate one chunk of synthetic listings.
+
+    Args:
+        n_rows: Number of listings
+        seed: Seed of the chunk
+        id_offset: First listing id of the chunk
+
+    Returns:
+        pl.DataFrame: Listings with the schema of src.data.cache.SCHEMA
+    """
+    rng = np.random.default_rng(seed)
+
+    year = np.clip(2021 - rng.gamma(2.0, 4.5, size=n_rows).round(), 1900, 2021)
+    odometer = rng.gamma(2.0, 5.0e4, size=n_rows) * (2022 - year) / 10
+    log_price = 9.6 + 0.08 * (year - 2010) - 0.25 * odometer / 1e5
+
+    columns = {}
+    for i, (col, (vocabulary, exponent, missing_rate)) in enumerate(
+        CATEGORICAL_SPECS.items()
+    ):
+        codes = _categorical(rng, n_rows, len(vocabulary), exponent)
+        log_price += _price_effects(len(vocabulary), seed=i)[codes]
+        values = pl.Series(col, vocabulary).gather(codes)
+        missing = rng.random(n_rows) < missing_rate
+        columns[col] = values.set(pl.Series(missing), None) if missing.any() else values
+
+    price = np.exp(log_price + rng.normal(0.0, 0.45, size=n_rows)).round()
+    absurd = rng.random(n_rows) < ABSURD_PRICE_RATE
+    price[absurd] = rng.choice(ABSURD_PRICES, size=absurd.sum())
+
+    posting_us = (
+        POSTING_START_US + rng.integers(0, POSTING_SECONDS, size=n_rows) * 1_000_000
+    )
+
+    df = pl.DataFrame(
+        {
+            "id": np.arange(id_offset, id_offset + n_rows, dtype=np.int64),
+            "price": price.astype(np.int64),
+            "year": year.astype(np.float64),
+            **columns,
+            "odometer": odometer.round(),
+            "posting_date": pl.Series(posting_us).cast(pl.Datetime("us", "UTC")),
+        }
+    )
+    return df.select(pl.col(col).cast(dtype) for col, dtype in SCHEMA.items())
+
+
+def iter_listings(
+    n_rows: int, seed: int = 0, chunk_size: int = CHUNK_SIZE
+) -> Iterator[pl.DataFrame]:
+    """
+    Generate synthetic listings chunk by chunk.
+
+    Args:
+        n_rows: Total number of listings
+        seed: Seed of the dataset
+        chunk_size: Number of listings per chunk
+
+    Yields:
+        pl.DataFrame: Consecutive chunks of the dataset
+    """
+    for chunk_index, start in enumerate(range(0, n_rows, chunk_size)):
+        yield generate_chunk(
+            min(chunk_size, n_rows - start),
+            seed=np.random.SeedSequence([seed, chunk_index]).generate_state(1)[0],
+            id_offset=start,
+        )
+
+
+def generate_listings(
+    n_rows: int, seed: int = 0, chunk_size: int = CHUNK_SIZE
+) -> pl.DataFrame:
+    """Generate a synthetic listing dataset in memory (see iter_listings)."""
+    return pl.concat(iter_listings(n_rows, seed, chunk_size), rechunk=True)
+
+
+def generate_splits(
+    n_rows: int, seed: int = 0, val_fraction: float = 0.2, test_fraction: float = 0.2
+) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+    """
+    Generate train, validation and test splits of the given training size.
+
+    Args:
+        n_rows: Number of training listings
+        seed: Seed of the splits
+        val_fraction: Size of the validation split relative to the training one
+        test_fraction: Size of the test split relative to the training one
+
+    Returns:
+        tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]: Train, val and test
+    """
+    train_df = generate_listings(n_rows, seed)
+    val_df = generate_listings(int(n_rows * val_fraction), seed + 1)
+    test_df = generate_listings(int(n_rows * test_fraction), seed + 2)
+    return train_df, val_df, test_df
+
+
+def write_listings(
+    path: str | Path, n_rows: int, seed: int = 0, chunk_size: int = CHUNK_SIZE
+) -> None:
+    """
+    Write a synthetic listing dataset to Parquet, one row group per chunk.
+
+    Only one chunk is held in memory at a time.
+    """
+    writer = None
+    try:
+        for chunk in iter_listings(n_rows, seed, chunk_size):
+            table = chunk.to_arrow()
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
@@ -8,10 +8,19 @@ a consistent interface.
 from abc import ABC, abstractmethod
 from typing import Optional
 
+import numpy as np
 import polars as pl
 from sklearn.base import BaseEstimator, TransformerMixin
 
 from src.config.preprocess import TargetEncoderConfig
+from src.features.label_encoding import LabelEncoder
+from src.features.stats import (
+    category_stats,
+    merge_stats,
+    stats_from_arrays,
+    stats_to_arrays,
+)
+from src.features.target_encoding import TargetEncoder
 
 
 class BaseEncoder(BaseEstimator, TransformerMixin, ABC):
@@ -27,6 +36,16 @@ class BaseEncoder(BaseEstimator, TransformerMixin, ABC):
         target_encoder_config: Configuration for target encoding
     """
 
+    # Input column of the encoder
+    column: str
+
+    # Whether the encoder is fitted from the category statistics of its column
+    requires_stats: bool = True
+
+    # Names of the fitted category-list attributes (e.g. grouping lists) that
+    # are part of the encoder's persisted state
+    _fitted_attributes: tuple[str, ...] = ()
+
     def __init__(
         self,
         use_target_encoding: bool = True,
@@ -40,7 +59,16 @@ class BaseEncoder(BaseEstimator, TransformerMixin, ABC):
                 "When use_target_encoding is True, target_encoder_config must be provided."
             )
 
-    @abstractmethod
+    @property
+    def requires_median(self) -> bool:
+        """Whether fit_from_stats needs the median target per category."""
+        return False
+
+    @property
+    def median_accuracy(self) -> float | None:
+        """Relative accuracy of the sketched median (exact median if None)."""
+        return None
+
     def fit(self, X: pl.DataFrame, y: pl.DataFrame) -> "BaseEncoder":
         """
         Fit the encoder to the training data.
@@ -52,9 +80,153 @@ class BaseEncoder(BaseEstimator, TransformerMixin, ABC):
         Returns:
             self: Fitted encoder instance
         """
+        stats = category_stats(
+            X.get_column(self.column),
+            y.get_column("price"),
+            median=self.requires_median,
+            median_accuracy=self.median_accuracy,
+        )
+        return self.fit_from_stats(stats)
+
+    def fit_from_stats(self, stats: pl.DataFrame) -> "BaseEncoder":
+        """
+        Fit the encoder from per-category statistics of the training data.
+
+        The statistics are kept (as stats_) so that partial_fit can add later
+        batches to them.
+
+        Args:
+            stats: Output of category_stats for the encoder's column
+
+        Returns:
+            self: Fitted encoder instance
+        """
+        if self.requires_stats:
+            self.stats_ = stats
+        return self._fit_from_stats(stats)
+
+    def partial_fit(
+        self, X: pl.DataFrame, y: pl.DataFrame, decay: float = 1.0
+    ) -> "BaseEncoder":
+        """
+        Update the fitted encoder with a new batch of training data.
+
+        The per-category counts and sums of the batch are added to the stored
+        statistics, after multiplying those by decay (exponential time decay
+        when batches arrive in order), and the grouping lists, label
+        vocabularies and target encodings are re-derived from the merged
+        statistics, in time proportional to the number of categories. Same as
+        fit if the encoder is not fitted yet, except that an exact median is
+        kept with the counts of every (category, price) pair, so that later
+        batches update it exactly; sketched medians (see median_accuracy) are
+        merged through their sketches. An exact median fitted by fit has no
+        such counts, and updating it raises a ValueError.
+
+        Args:
+            X: Input features of the batch (DataFrame)
+            y: Target variable of the batch (DataFrame)
+            decay: Weight of the stored statistics, in (0, 1] (1 for no decay)
+
+        Returns:
+            self: Updated encoder instance
+        """
+        if not self.requires_stats:
+            return self.fit(X, y)
+
+        stats = getattr(self, "stats_", None)
+        if (
+            stats is not None
+            and "median" in stats.columns
+            and "sketch" not in stats.columns
+        ):
+            raise ValueError(
+                f"The exact median of {type(self).__name__} fitted by fit cannot "
+                "be updated: fit it with partial_fit from the start, or sketch "
+                "the median (median_sketch_accuracy)."
+            )
+
+        batch = category_stats(
+            X.get_column(self.column),
+            y.get_column("price"),
+            median=self.requires_median,
+            median_accuracy=self.median_accuracy,
+            mergeable_median=True,
+        )
+        if stats is not None:
+            batch = merge_stats(stats, batch, decay)
+        return self.fit_from_stats(batch)
+
+    @abstractmethod
+    def _fit_from_stats(self, stats: pl.DataFrame) -> "BaseEncoder":
+        """Derive the fitted state from per-category statistics."""
         pass
 
     @abstractmethod
+    def transform_exprs(
+        self,
+        n_rows: int,
+        add_noise: bool = True,
+        rng: np.random.Generator | None = None,
+    ) -> list[pl.Expr]:
+        """
+        Build the polars expressions that produce the transformed columns.
+
+        The expressions only reference the encoder's input column, so the
+        expressions of several encoders can be evaluated in one select.
+
+        Args:
+            n_rows: Number of rows of the frame the expressions are evaluated on
+            add_noise: Whether to add target-encoding noise (disable for scoring)
+            rng: Generator of the noise (the global numpy generator if None)
+
+        Returns:
+            list[pl.Expr]: One expression per output column, in output order
+        """
+        pass
+
+    def encode_exprs(
+        self,
+        schema: pl.Schema,
+        n_rows: int,
+        add_noise: bool = True,
+        rng: np.random.Generator | None = None,
+    ) -> list[pl.Expr]:
+        """
+        Build the output expressions for a frame with the given schema.
+
+        String columns use transform_exprs directly. Enum columns are encoded
+        on their physical codes: every output is precomputed once per category
+        of the Enum and gathered by code, so no strings are materialized.
+        Missing values are encoded through an extra row after the categories.
+
+        Args:
+            schema: Schema of the frame the expressions are evaluated on
+            n_rows: Number of rows of the frame
+            add_noise: Whether to add target-encoding noise (disable for scoring)
+            rng: Generator of the noise (the global numpy generator if None)
+
+        Returns:
+            list[pl.Expr]: One expression per output column, in output order
+        """
+        dtype = schema[self.column]
+        if not isinstance(dtype, pl.Enum):
+            return self.transform_exprs(n_rows, add_noise, rng)
+
+        # 最後の行は欠損値の出力
+        categories = dtype.categories
+        table = pl.DataFrame(
+            {self.column: pl.concat([categories, pl.Series([None], dtype=pl.String)])}
+        ).select(self.transform_exprs(len(categories) + 1, add_noise=False))
+
+        codes = pl.col(self.column).to_physical().fill_null(len(categories))
+        exprs = []
+        for name in table.columns:
+            expr = pl.lit(table.get_column(name)).gather(codes)
+            if name == f"{self.column}_te":
+                expr = self.target_encoder.add_noise_expr(expr, n_rows, add_noise, rng)
+            exprs.append(expr.alias(name))
+        return exprs
+
     def transform(self, X: pl.DataFrame) -> pl.DataFrame:
         """
         Transform the input data using the fitted encoder.
@@ -65,7 +237,103 @@ class BaseEncoder(BaseEstimator, TransformerMixin, ABC):
         Returns:
             pl.DataFrame: Transformed features
         """
-        pass
+        return X.select(self.encode_exprs(X.schema, X.height))
+
+    def get_fitted_state(self) -> dict[str, np.ndarray]:
+        """
+        Export the fitted state of the encoder as flat numpy arrays.
+
+        Returns:
+            dict[str, np.ndarray]: Fitted state, restorable with set_fitted_state
+        """
+        state = {}
+        for name in self._fitted_attributes:
+            if hasattr(self, name):
+                state[name] = np.asarray(getattr(self, name), dtype=str)
+
+        if hasattr(self, "label_encoder"):
+            for key, value in self.label_encoder.get_fitted_state().items():
+                state[f"label_encoder.{key}"] = value
+
+        if hasattr(self, "target_encoder"):
+            for key, value in self.target_encoder.get_fitted_state().items():
+                state[f"target_encoder.{key}"] = value
+
+        if getattr(self, "stats_", None) is not None:
+            for key, value in stats_to_arrays(self.stats_).items():
+                state[f"stats.{key}"] = value
+
+        return state
+
+    def set_fitted_state(self, state: dict[str, np.ndarray]) -> "BaseEncoder":
+        """
+        Restore the fitted state exported by get_fitted_state.
+
+        Args:
+            state: Fitted state of an encoder with the same configuration
+
+        Returns:
+            self: Fitted encoder instance
+        """
+        for name in self._fitted_attributes:
+            if name in state:
+                setattr(self, name, state[name].tolist())
+
+        label_encoder_state = {
+            key.removeprefix("label_encoder."): value
+            for key, value in state.items()
+            if key.startswith("label_encoder.")
+        }
+        if label_encoder_state:
+            self.label_encoder = LabelEncoder().set_fitted_state(label_encoder_state)
+
+        target_encoder_state = {
+            key.removeprefix("target_encoder."): value
+            for key, value in state.items()
+            if key.startswith("target_encoder.")
+        }
+        if target_encoder_state:
+            self.target_encoder = self._make_target_encoder()
+            self.target_encoder.set_fitted_state(target_encoder_state)
+
+        stats_state = {
+            key.removeprefix("stats."): value
+            for key, value in state.items()
+            if key.startswith("stats.")
+        }
+        if stats_state:
+            self.stats_ = stats_from_arrays(stats_state)
+
+        return self
+
+    def record_vocabulary(self) -> list:
+        """
+        Raw input values the encoder knows about from fitting.
+
+        Used to precompute per-value outputs for single-record scoring; values
+        outside the vocabulary are still handled through transform_exprs.
+
+        Returns:
+            list: Known raw values of the input column
+        """
+        values = set()
+        for name in self._fitted_attributes:
+            values.update(getattr(self, name, []))
+        if hasattr(self, "label_encoder"):
+            values.update(self.label_encoder.classes_.tolist())
+        if hasattr(self, "target_encoder"):
+            values.update(self.target_encoder.categories_.tolist())
+        # 欠損値は未知の値と同じ経路で評価する
+        values.discard(None)
+        return sorted(values)
+
+    def _make_target_encoder(self) -> TargetEncoder:
+        """Create an unfitted target encoder from target_encoder_config."""
+        return TargetEncoder(
+            smoothing=self.target_encoder_config.smoothing,
+            min_samples_leaf=self.target_encoder_config.min_samples_leaf,
+            noise_level=self.target_encoder_config.noise_level,
+        )
 
     def fit_transform(self, X: pl.DataFrame, y: pl.DataFrame) -> pl.DataFrame:
         """
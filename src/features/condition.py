@@ -1,11 +1,13 @@
+import numpy as np
 import polars as pl
 
 from src.config.preprocess import TargetEncoderConfig
 from src.features.base_encoder import BaseEncoder
-from src.features.target_encoding import TargetEncoder
 
 
 class ConditionEncoder(BaseEncoder):
+    column = "condition"
+
     def __init__(
         self,
         use_target_encoding: bool = True,
@@ -32,30 +34,27 @@ class ConditionEncoder(BaseEncoder):
             .alias("condition_numerical")
         )
 
-    def fit(self, X: pl.DataFrame, y: pl.DataFrame) -> "ConditionEncoder":
+    def _fit_from_stats(self, stats: pl.DataFrame) -> "ConditionEncoder":
         if self.use_target_encoding:
-            self.target_encoder = TargetEncoder(
-                smoothing=self.target_encoder_config.smoothing,
-                min_samples_leaf=self.target_encoder_config.min_samples_leaf,
-                noise_level=self.target_encoder_config.noise_level,
-            )
-            self.target_encoder.fit(X.select("condition").to_numpy(), y.to_numpy())
+            self.target_encoder = self._make_target_encoder().fit_stats(stats)
         return self
 
-    def transform(self, X: pl.DataFrame) -> pl.DataFrame:
-        result = X.with_columns(self.numerical_conversion_expr)
+    def transform_exprs(
+        self,
+        n_rows: int,
+        add_noise: bool = True,
+        rng: np.random.Generator | None = None,
+    ) -> list[pl.Expr]:
+        exprs = [self.numerical_conversion_expr]
 
         if self.use_target_encoding:
-            result = result.with_columns(
-                pl.Series(
-                    name="condition_te",
-                    values=self.target_encoder.transform(
-                        X.select("condition").to_numpy()
-                    ),
-                )
+            exprs.append(
+                self.target_encoder.transform_expr(
+                    pl.col("condition"), n_rows, add_noise, rng
+                ).alias("condition_te")
             )
 
-        return result.drop("condition")
+        return exprs
 
     def fit_transform(self, X: pl.DataFrame, y: pl.DataFrame) -> pl.DataFrame:
         self.fit(X, y)
@@ -1,13 +1,15 @@
 from typing import Union
 
+import numpy as np
 import polars as pl
 
 from src.config.preprocess import TargetEncoderConfig
 from src.features.base_encoder import BaseEncoder
-from src.features.target_encoding import TargetEncoder
 
 
 class CylindersEncoder(BaseEncoder):
+    column = "cylinders"
+
     def __init__(
         self,
         use_target_encoding: bool = True,
@@ -23,30 +25,25 @@ class CylindersEncoder(BaseEncoder):
             .alias("cylinders_numerical")
         )
 
-    def fit(self, X: pl.DataFrame, y: pl.DataFrame) -> "CylindersEncoder":
+    def _fit_from_stats(self, stats: pl.DataFrame) -> "CylindersEncoder":
         if self.use_target_encoding:
-            self.target_encoder = TargetEncoder(
-                smoothing=self.target_encoder_config.smoothing,
-                min_samples_leaf=self.target_encoder_config.min_samples_leaf,
-                noise_level=self.target_encoder_config.noise_level,
-            )
-            self.target_encoder.fit(
-                X.select("cylinders").to_numpy(), y.select("price").to_numpy()
-            )
+            self.target_encoder = self._make_target_encoder().fit_stats(stats)
         return self
 
-    def transform(self, X: pl.DataFrame) -> pl.DataFrame:
-        result = X.with_columns(self.cylinder_expr)
+    def transform_exprs(
+        self,
+        n_rows: int,
+        add_noise: bool = True,
+        rng: np.random.Generator | None = None,
+    ) -> list[pl.Expr]:
+        exprs = [self.cylinder_expr]
 
         # ターゲットエンコーディング
         if self.use_target_encoding:
-            result = result.with_columns(
-                pl.Series(
-                    name="cylinders_te",
-                    values=self.target_encoder.transform(
-                        result.select("cylinders").to_numpy()
-                    ),
-                )
+            exprs.append(
+                self.target_encoder.transform_expr(
+                    pl.col("cylinders"), n_rows, add_noise, rng
+                ).alias("cylinders_te")
             )
 
-        return result.drop("cylinders")
+        return exprs
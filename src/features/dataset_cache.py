@@ -0,0 +1,276 @@
+"""
+Cache of constructed (binned) LightGBM Datasets.
+
+Constructing a Dataset bins every feature, which dominates the cost of short
+trainings. When only the training hyperparameters change, the binned Dataset
+of the same feature matrix can be reused as is. Datasets are keyed by a
+fingerprint of the feature matrix (values, feature names and label), the
+binning-relevant parameters and the reference Dataset, kept in memory (least
+recently used first out) and optionally saved as LightGBM binary files,
+which are evicted least recently used first beyond a size budget.
+
+Every Dataset, cached or not, is constructed by build_dataset with the same
+parameters (the binning ones, and feature_pre_filter=False so that it can be
+trained with any min_data_in_leaf), so a model trained on a cached Dataset
+is the same as one trained on a Dataset built from scratch.
+"""
+
+import hashlib
+import os
+import weakref
+from collections import OrderedDict
+from pathlib import Path
+
+import lightgbm as lgb
+
+from src.features.matrix import FeatureMatrix
+
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+# Dataset parameters that change the binning, with their aliases
+BINNING_PARAMS = {
+    "max_bin": ("max_bins",),
+    "max_bin_by_feature": (),
+    "min_data_in_bin": (),
+    "bin_construct_sample_cnt": ("subsample_for_bin",),
+    "data_random_seed": ("data_seed",),
+    "seed": ("random_seed", "random_state"),
+    "use_missing": (),
+    "zero_as_missing": (),
+    "categorical_feature": (
+        "cat_feature",
+        "categorical_column",
+        "cat_column",
+        "categorical_features",
+    ),
+    "forcedbins_filename": (),
+    "linear_tree": ("linear_trees",),
+    "enable_bundle": ("is_enable_bundle", "bundle"),
+    "max_conflict_rate": (),
+    "is_enable_sparse": ("is_sparse", "enable_sparse", "sparse"),
+}
+
+
+def binning_params(params: dict | None) -> dict:
+    """
+    Extract the parameters that change the binning of a Dataset.
+
+    Args:
+        params: LightGBM parameters (training or Dataset parameters)
+
+    Returns:
+        dict: Binning parameters under their canonical names
+    """
+    params = params or {}
+    binning = {}
+    for name, aliases in BINNING_PARAMS.items():
+        for key in (name, *aliases):
+            if key in params:
+                binning[name] = params[key]
+                break
+    return binning
+
+
+def dataset_params(params: dict | None) -> dict:
+    """
+    Parameters every Dataset is constructed with.
+
+    Args:
+        params: LightGBM parameters (training or Dataset parameters)
+
+    Returns:
+        dict: Binning parameters, feature_pre_filter=False and verbosity=-1
+    """
+    return {**binning_params(params), "feature_pre_filter": False, "verbosity": -1}
+
+
+def build_dataset(
+    matrix: FeatureMatrix,
+    params: dict | None = None,
+    reference: lgb.Dataset | None = None,
+) -> lgb.Dataset:
+    """
+    Construct the Dataset of a matrix (the same with or without a cache).
+
+    Args:
+        matrix: Features and label
+        params: LightGBM parameters; only the binning ones are used
+        reference: Training Dataset of a validation set
+
+    Returns:
+        lgb.Dataset: Constructed Dataset
+    """
+    return matrix.to_dataset(
+        reference=reference, params=dataset_params(params)
+    ).construct()
+
+
+def fingerprint(matrix: FeatureMatrix) -> str:
+    """Content hash of a feature matrix (values, feature names and label)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((matrix.shape, matrix.feature_names)).encode())
+    digest.update(matrix.data)
+    if matrix.label is not None:
+        digest.update(matrix.label.tobytes())
+    return digest.hexdigest()
+
+
+class DatasetCache:
+    """
+    In-memory (and optionally on-disk) cache of constructed LightGBM Datasets.
+
+    Args:
+        cache_dir: Directory of the LightGBM binary files (memory only if None)
+        max_entries: Maximum number of Datasets kept in memory
+        max_bytes: Size budget of cache_dir; least recently used files are
+            evicted beyond it (the newest file is always kept)
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path | None = None,
+        max_entries: int = 4,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._datasets: OrderedDict[str, lgb.Dataset] = OrderedDict()
+        self._keys: weakref.WeakKeyDictionary[lgb.Dataset, str] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def key(
+        self,
+        matrix: FeatureMatrix,
+        params: dict | None = None,
+        reference: lgb.Dataset | None = None,
+    ) -> str:
+        """Cache key of the Dataset of a matrix (see get)."""
+        if reference is not None and reference not in self._keys:
+            raise ValueError("reference must be a Dataset returned by this cache.")
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(fingerprint(matrix).encode())
+        digest.update(repr(sorted(binning_params(params).items())).encode())
+        if reference is not None:
+            digest.update(self._keys[reference].encode())
+        return digest.hexdigest()
+
+    def get(
+        self,
+        matrix: FeatureMatrix,
+        params: dict | None = None,
+        reference: lgb.Dataset | None = None,
+    ) -> lgb.Dataset:
+        """
+        Return the constructed Dataset of a matrix, building it on a miss.
+
+        Args:
+            matrix: Features and label
+            params: LightGBM parameters; only the binning ones are used
+            reference: Training Dataset (from this cache) of a validation set
+
+        Returns:
+            lgb.Dataset: Constructed Dataset
+        """
+        key = self.key(matrix, params, reference)
+        dataset = self._datasets.get(key)
+        if dataset is not None:
+            self._datasets.move_to_end(key)
+            return dataset
+
+        path = self.cache_dir / f"{key}.bin" if self.cache_dir is not None else None
+        dataset = None
+        if path is not None:
+            dataset = self._load(path, reference, dataset_params(params))
+        if dataset is None:
+            dataset = build_dataset(matrix, params, reference)
+            if path is not None:
+                self._save(dataset, path)
+
+        self._datasets[key] = dataset
+        self._keys[dataset] = key
+        while len(self._datasets) > self.max_entries:
+            self._datasets.popitem(last=False)
+        return dataset
+
+    def size(self) -> int:
+        """Total size of the binary files in bytes."""
+        return sum(size for _, _, size in self._files())
+
+    def _load(
+        self, path: Path, reference: lgb.Dataset | None, params: dict
+    ) -> lgb.Dataset | None:
+        try:
+            # The modification time of a file orders the LRU eviction
+            os.utime(path)
+            return lgb.Dataset(
+                str(path), reference=reference, params=params
+            ).construct()
+        except (FileNotFoundError, lgb.basic.LightGBMError):
+            # Not cached, or evicted by another process meanwhile
+            return None
+
+    def _save(self, dataset: lgb.Dataset, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so that a concurrent reader never
+        # sees a partially written file
+        tmp_path = path.with_suffix(f".bin.{os.getpid()}.tmp")
+        dataset.save_binary(str(tmp_path))
+        os.replace(tmp_path, path)
+        self._evict(keep=path)
+
+    def _files(self) -> list[tuple[float, Path, int]]:
+        # (last access time, path, size) of every binary file, least recent first
+        if self.cache_dir is None or not self.cache_dir.is_dir():
+            return []
+        files = []
+        for path in self.cache_dir.glob("*.bin"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # Evicted by another process meanwhile
+                continue
+            files.append((stat.st_mtime, path, stat.st_size))
+        return sorted(files)
+
+    def _evict(self, keep: Path) -> None:
+        files = self._files()
+        total = sum(size for _, _, size in files)
+        for _, path, size in files:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def train_valid_datasets(
+    train_matrix: FeatureMatrix,
+    valid_matrix: FeatureMatrix,
+    params: dict | None = None,
+    cache: DatasetCache | None = None,
+) -> tuple[lgb.Dataset, lgb.Dataset]:
+    """
+    Build the training and validation Datasets, through a cache if given.
+
+    The Datasets are constructed the same way with or without a cache (see
+    build_dataset), so the trained models are the same.
+
+    Args:
+        train_matrix: Training features and label
+        valid_matrix: Validation features and label
+        params: LightGBM parameters; only the binning ones are used
+        cache: Dataset cache (Datasets are built from scratch if None)
+
+    Returns:
+        tuple[lgb.Dataset, lgb.Dataset]: Training and validation Datasets
+    """
+    if cache is None:
+        train_set = build_dataset(train_matrix, params)
+        return train_set, build_dataset(valid_matrix, params, reference=train_set)
+
+    train_set = cache.get(train_matrix, params)
+    return train_set, cache.get(valid_matrix, params, reference=train_set)
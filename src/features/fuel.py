@@ -1,14 +1,16 @@
 from typing import Union
 
+import numpy as np
 import polars as pl
-from sklearn.preprocessing import LabelEncoder
 
 from src.config.preprocess import TargetEncoderConfig
 from src.features.base_encoder import BaseEncoder
-from src.features.target_encoding import TargetEncoder
+from src.features.label_encoding import LabelEncoder
 
 
 class FuelEncoder(BaseEncoder):
+    column = "fuel"
+
     def __init__(
         self,
         use_label_encoding: bool = True,
@@ -18,37 +20,32 @@ class FuelEncoder(BaseEncoder):
         super().__init__(use_target_encoding, target_encoder_config)
         self.use_label_encoding = use_label_encoding
 
-    def fit(self, X: pl.DataFrame, y: pl.DataFrame) -> "FuelEncoder":
+    def _fit_from_stats(self, stats: pl.DataFrame) -> "FuelEncoder":
         if self.use_label_encoding:
-            self.label_encoder = LabelEncoder()
-            self.label_encoder.fit(X.to_numpy().ravel())
+            self.label_encoder = LabelEncoder().fit_stats(stats)
 
         if self.use_target_encoding:
-            self.target_encoder = TargetEncoder(
-                smoothing=self.target_encoder_config.smoothing,
-                min_samples_leaf=self.target_encoder_config.min_samples_leaf,
-                noise_level=self.target_encoder_config.noise_level,
-            )
-            self.target_encoder.fit(X.to_numpy(), y.to_numpy())
+            self.target_encoder = self._make_target_encoder().fit_stats(stats)
         return self
 
-    def transform(self, X: pl.DataFrame) -> pl.DataFrame:
-        result = X.clone()
+    def transform_exprs(
+        self,
+        n_rows: int,
+        add_noise: bool = True,
+        rng: np.random.Generator | None = None,
+    ) -> list[pl.Expr]:
+        exprs = []
         if self.use_label_encoding:
-            result = result.with_columns(
-                pl.Series(
-                    name="fuel_label",
-                    values=self.label_encoder.transform(X.to_numpy().ravel()),
-                )
+            exprs.append(
+                self.label_encoder.transform_expr(pl.col("fuel")).alias("fuel_label")
             )
 
         # ターゲットエンコーディング
         if self.use_target_encoding:
-            result = result.with_columns(
-                pl.Series(
-                    name="fuel_te",
-                    values=self.target_encoder.transform(X),
-                )
+            exprs.append(
+                self.target_encoder.transform_expr(
+                    pl.col("fuel"), n_rows, add_noise, rng
+                ).alias("fuel_te")
             )
 
-        return result.drop("fuel")
+        return exprs
@@ -0,0 +1,184 @@
+"""
+Opt-in per-stage instrumentation of the Preprocessor.
+
+Once Preprocessor.instrument() has been called, every stage of fit, transform
+and run is measured and recorded as a StageRecord:
+
+- remove_outliers: price-outlier filtering of a split
+- stats: shared per-category statistics pass over the training data
+- fit: fitting of one encoder (from the data or from cached statistics)
+- transform: output columns of one encoder for one split
+- concat: assembly of the encoder outputs into the feature frame of a split
+
+Records are collected in a PreprocessReport and passed to every subscribed
+hook as soon as the stage ends. With Preprocessor(n_jobs > 1) the encoder
+stages run on worker threads, so hooks must be thread-safe and the records of
+concurrent stages may arrive in any order. Without instrumentation the Preprocessor runs
+its usual fused plan and only pays one attribute check per stage. With it,
+each encoder's transform is collected separately (the fused plan cannot be
+attributed to encoders), which gives the same frame at a somewhat higher cost.
+
+Memory is reported as output_bytes: the estimated size of the stage output
+(the filtered or transformed frame, or the fitted state of an encoder). It is
+not the memory allocated by the stage: polars allocates in native code that
+Python cannot trace, and the process-wide resident memory cannot be
+attributed to one stage when stages run concurrently. For fit stages the
+column count is the number of feature columns the fitted encoder produces.
+"""
+
+import time
+from collections.abc import Callable
+from dataclasses import asdict, dataclass
+
+import numpy as np
+import polars as pl
+
+from src.features.base_encoder import BaseEncoder
+
+
+@dataclass(frozen=True)
+class StageRecord:
+    """
+    Measurement of one preprocessing stage.
+
+    Args:
+        stage: Kind of stage (remove_outliers, stats, fit, transform or concat)
+        name: Encoder column, or "all" for the stages of a whole split
+        split: Split the stage ran on (train, val, test, or data outside run)
+        seconds: Wall time
+        rows: Number of input rows (0 if unknown, e.g. for a LazyFrame)
+        output_bytes: Estimated size of the output (not the memory allocated
+            while computing it)
+        output_columns: Number of output columns
+    """
+
+    stage: str
+    name: str
+    split: str
+    seconds: float
+    rows: int
+    output_bytes: int
+    output_columns: int
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else float("inf")
+
+
+Hook = Callable[[StageRecord], None]
+
+
+class PreprocessReport:
+    """Stage records of an instrumented Preprocessor, in execution order."""
+
+    def __init__(self):
+        self.records: list[StageRecord] = []
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def select(
+        self, stage: str | None = None, split: str | None = None
+    ) -> list[StageRecord]:
+        """Records of the given stage and split (all if None)."""
+        return [
+            record
+            for record in self.records
+            if (stage is None or record.stage == stage)
+            and (split is None or record.split == split)
+        ]
+
+    def total_seconds(self, stage: str | None = None, split: str | None = None):
+        return sum(record.seconds for record in self.select(stage, split))
+
+    def to_frame(self) -> pl.DataFrame:
+        """One row per record, with rows_per_second."""
+        return pl.DataFrame(
+            [
+                {**asdict(record), "rows_per_second": record.rows_per_second}
+                for record in self.records
+            ],
+            schema={
+                "stage": pl.String,
+                "name": pl.String,
+                "split": pl.String,
+                "seconds": pl.Float64,
+                "rows": pl.Int64,
+                "output_bytes": pl.Int64,
+                "output_columns": pl.Int64,
+                "rows_per_second": pl.Float64,
+            },
+        )
+
+    def clear(self) -> None:
+        self.records.clear()
+
+
+def _output_size(output: object) -> tuple[int, int]:
+    """Estimated size in bytes and number of columns of a stage output."""
+    if isinstance(output, pl.DataFrame):
+        return int(output.estimated_size()), output.width
+    if isinstance(output, dict):
+        # 列ごとの統計フレーム
+        sizes = [_output_size(value) for value in output.values()]
+        return sum(size for size, _ in sizes), sum(width for _, width in sizes)
+    if isinstance(output, BaseEncoder):
+        # 学習済み状態のサイズと、エンコーダーが出力する特徴量の列数
+        state_bytes = sum(
+            np.asarray(value).nbytes for value in output.get_fitted_state().values()
+        )
+        return state_bytes, len(output.transform_exprs(0, add_noise=False))
+    return 0, 0
+
+
+class Instrumentation:
+    """
+    Recorder of Preprocessor stages.
+
+    Args:
+        hooks: Callables invoked with each StageRecord when its stage ends
+    """
+
+    def __init__(self, hooks: list[Hook] | tuple[Hook, ...] = ()):
+        self.report = PreprocessReport()
+        self._hooks = list(hooks)
+
+    def subscribe(self, hook: Hook) -> Hook:
+        """Invoke hook with every subsequent StageRecord (returns hook)."""
+        self._hooks.append(hook)
+        return hook
+
+    def unsubscribe(self, hook: Hook) -> None:
+        self._hooks.remove(hook)
+
+    def measure(
+        self, stage: str, name: str, split: str, rows: int, fn: Callable[[], object]
+    ):
+        """
+        Run fn as one stage and record it.
+
+        Args:
+            stage: Kind of stage
+            name: Encoder column, or "all"
+            split: Split the stage runs on
+            rows: Number of input rows (0 if unknown, e.g. for a LazyFrame)
+            fn: Stage to run
+
+        Returns:
+            The return value of fn
+        """
+        start = time.perf_counter()
+        output = fn()
+        seconds = time.perf_counter() - start
+
+        output_bytes, output_columns = _output_size(output)
+        record = StageRecord(
+            stage, name, split, seconds, rows, output_bytes, output_columns
+        )
+        self.report.records.append(record)
+        for hook in self._hooks:
+            hook(record)
+        return output
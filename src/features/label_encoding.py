@@ -0,0 +1,87 @@
+import numpy as np
+import polars as pl
+
+from src.features.target_encoding import _to_series
+
+# 学習時に存在しなかったカテゴリに割り当てるコード
+UNKNOWN_CODE = -1
+
+
+class LabelEncoder:
+    """
+    カテゴリを整数コードに変換するエンコーダー
+
+    語彙（昇順のカテゴリ）は固定長文字列の numpy 配列で保持し、変換は
+    語彙 -> コードの対応表による polars の1パスで行う。未知のカテゴリは
+    UNKNOWN_CODE、欠損値は欠損値のままにする。
+    """
+
+    def __init__(self):
+        self.classes_ = np.array([], dtype=str)
+
+    def fit(self, X: np.ndarray | pl.Series | pl.DataFrame) -> "LabelEncoder":
+        """
+        学習データのカテゴリ（欠損値を除く）を昇順の語彙にする
+        """
+        self.classes_ = (
+            _to_series(X).cast(pl.String).drop_nulls().unique().sort().to_numpy()
+        ).astype(str)
+        return self
+
+    def fit_stats(self, stats: pl.DataFrame) -> "LabelEncoder":
+        """
+        カテゴリ統計（category_stats / group_stats の出力）のカテゴリを語彙にする
+
+        統計はカテゴリ昇順に並んでいるため、そのまま語彙として使える
+        """
+        self.classes_ = stats.get_column("category").drop_nulls().to_numpy().astype(str)
+        return self
+
+    def transform(self, X: np.ndarray | pl.Series | pl.DataFrame) -> np.ndarray:
+        """
+        カテゴリを整数コードに変換（欠損値は NaN）
+        """
+        X = _to_series(X).cast(pl.String)
+        return pl.select(self.transform_expr(pl.lit(X))).to_series().to_numpy()
+
+    def transform_expr(self, expr: pl.Expr) -> pl.Expr:
+        """
+        ラベルエンコーディングを行う polars 式を返す
+
+        Args:
+            expr: カテゴリ列の式
+
+        Returns:
+            pl.Expr: 語彙内の位置を表す Int64 のコード（未知は UNKNOWN_CODE）
+        """
+        codes = expr.replace_strict(
+            pl.Series(self.classes_, dtype=pl.String),
+            np.arange(len(self.classes_)),
+            default=UNKNOWN_CODE,
+            return_dtype=pl.Int64,
+        )
+        # replace_strict は欠損値も default にするため、欠損値を戻す
+        return pl.when(expr.is_not_null()).then(codes)
+
+    def inverse_transform(self, codes: np.ndarray) -> np.ndarray:
+        """
+        整数コードをカテゴリに戻す（未知のコードは None）
+        """
+        codes = np.asarray(codes)
+        known = (codes >= 0) & (codes < len(self.classes_))
+        categories = np.full(codes.shape, None, dtype=object)
+        categories[known] = self.classes_[codes[known]]
+        return categories
+
+    def get_fitted_state(self) -> dict[str, np.ndarray]:
+        """
+        学習済みの語彙を numpy 配列として出力
+        """
+        return {"classes_": np.asarray(self.classes_, dtype=str)}
+
+    def set_fitted_state(self, state: dict[str, np.ndarray]) -> "LabelEncoder":
+        """
+        get_fitted_state で出力した語彙を復元
+        """
+        self.classes_ = np.asarray(state["classes_"], dtype=str)
+        return self
@@ -1,14 +1,18 @@
 from typing import Union
 
+import numpy as np
 import polars as pl
-from sklearn.preprocessing import LabelEncoder
 
 from src.config.preprocess import TargetEncoderConfig
 from src.features.base_encoder import BaseEncoder
-from src.features.target_encoding import TargetEncoder
+from src.features.label_encoding import LabelEncoder
+from src.features.stats import group_stats
 
 
 class ManufacturerEncoder(BaseEncoder):
+    column = "manufacturer"
+    _fitted_attributes = ("major_manufacturers_",)
+
     def __init__(
         self,
         use_grouping: bool = True,
@@ -38,65 +42,56 @@ class ManufacturerEncoder(BaseEncoder):
             .alias("is_potentially_overpriced_manufacturer")
         )
 
-    def fit(self, X: pl.DataFrame, y: pl.DataFrame) -> "ManufacturerEncoder":
+    @property
+    def manufacturer_expr(self) -> pl.Expr:
+        return (
+            pl.when(pl.col("manufacturer").is_in(self.major_manufacturers_))
+            .then(pl.col("manufacturer"))
+            .otherwise(pl.lit("other_manufacturers"))
+            .alias("manufacturer")
+        )
+
+    def _fit_from_stats(self, stats: pl.DataFrame) -> "ManufacturerEncoder":
         # カテゴリカル変数のエンコーディング
         if self.use_grouping:
-            combined_df = pl.concat([X, y], how="horizontal")
-            major_manufacturers = (
-                combined_df.group_by("manufacturer")
-                .agg(pl.len().alias("count"))
-                .filter(pl.col("count") >= 200)
-                .select("manufacturer")
-                .to_series()
-                .to_list()
+            self.major_manufacturers_ = (
+                stats.filter(pl.col("count") >= 200).get_column("category").to_list()
             )
-            self.manufacturer_expr = (
-                pl.when(pl.col("manufacturer").is_in(major_manufacturers))
-                .then(pl.col("manufacturer"))
-                .otherwise(pl.lit("other_manufacturers"))
-                .alias("manufacturer")
-            )
-            X = X.with_columns(self.manufacturer_expr)
+            stats = group_stats(stats, self.major_manufacturers_, "other_manufacturers")
 
         if self.use_label_encoding:
-            self.label_encoder = LabelEncoder()
-            self.label_encoder.fit(X.select("manufacturer").to_numpy().ravel())
+            self.label_encoder = LabelEncoder().fit_stats(stats)
 
         if self.use_target_encoding:
-            self.target_encoder = TargetEncoder(
-                smoothing=self.target_encoder_config.smoothing,
-                min_samples_leaf=self.target_encoder_config.min_samples_leaf,
-                noise_level=self.target_encoder_config.noise_level,
-            )
-            self.target_encoder.fit(X.select("manufacturer").to_numpy(), y.to_numpy())
+            self.target_encoder = self._make_target_encoder().fit_stats(stats)
         return self
 
-    def transform(self, X: pl.DataFrame) -> pl.DataFrame:
-        result = X.with_columns(self.premium_expr, self.potential_expr)
+    def transform_exprs(
+        self,
+        n_rows: int,
+        add_noise: bool = True,
+        rng: np.random.Generator | None = None,
+    ) -> list[pl.Expr]:
+        exprs = [self.premium_expr, self.potential_expr]
 
-        if self.use_grouping:
-            result = result.with_columns(self.manufacturer_expr)
+        manufacturer = (
+            self.manufacturer_expr if self.use_grouping else pl.col("manufacturer")
+        )
 
         # ラベルエンコーディング
         if self.use_label_encoding:
-            result = result.with_columns(
-                pl.Series(
-                    name="manufacturer_label",
-                    values=self.label_encoder.transform(
-                        result.select("manufacturer").to_numpy().ravel()
-                    ),
+            exprs.append(
+                self.label_encoder.transform_expr(manufacturer).alias(
+                    "manufacturer_label"
                 )
             )
 
         # ターゲットエンコーディング
         if self.use_target_encoding:
-            result = result.with_columns(
-                pl.Series(
-                    name="manufacturer_te",
-                    values=self.target_encoder.transform(
-                        result.select("manufacturer").to_numpy()
-                    ),
-                )
+            exprs.append(
+                self.target_encoder.transform_expr(
+                    manufacturer, n_rows, add_noise, rng
+                ).alias("manufacturer_te")
             )
 
-        return result.drop("manufacturer")
+        return exprs
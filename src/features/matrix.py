@@ -0,0 +1,102 @@
+"""
+Feature matrices handed from the preprocessed polars frames to LightGBM.
+
+The feature columns are cast to float32 and copied once into a C-contiguous
+numpy array, which LightGBM reads in place both when constructing a Dataset
+and when predicting. There is no pandas round trip and no further float64
+conversion inside LightGBM. Column names are kept next to the array and
+passed to LightGBM as feature names.
+"""
+
+from typing import Sequence
+
+import lightgbm as lgb
+import numpy as np
+import polars as pl
+
+# Columns of the preprocessed frames that are never features
+TARGET_COLUMNS = ("price", "is_anomaly")
+
+
+class FeatureMatrix:
+    """
+    Contiguous float32 feature matrix with its feature names and label.
+
+    Args:
+        data: Features, shape (n_rows, n_features), float32 and C-contiguous
+        feature_names: Name of every column of data
+        label: Target values, or None for prediction-only matrices
+    """
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        feature_names: list[str],
+        label: np.ndarray | None = None,
+    ):
+        if data.ndim != 2 or data.shape[1] != len(feature_names):
+            raise ValueError("data must have one column per feature name.")
+
+        self.data = np.ascontiguousarray(data, dtype=np.float32)
+        self.feature_names = list(feature_names)
+        self.label = label
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pl.DataFrame,
+        label: str | None = None,
+        exclude: Sequence[str] = TARGET_COLUMNS,
+    ) -> "FeatureMatrix":
+        """
+        Build the feature matrix of a preprocessed frame.
+
+        Nulls become NaN, which LightGBM treats as missing values.
+
+        Args:
+            df: Output of the Preprocessor (optionally with extra target columns)
+            label: Column used as the label (none if None)
+            exclude: Columns that are not features
+
+        Returns:
+            FeatureMatrix: All the other columns as float32 features, in order
+        """
+        excluded = set(exclude) | ({label} if label is not None else set())
+        feature_names = [col for col in df.columns if col not in excluded]
+
+        data = df.select(pl.col(feature_names).cast(pl.Float32)).to_numpy(order="c")
+        label_values = (
+            df.get_column(label).cast(pl.Float64).to_numpy()
+            if label is not None
+            else None
+        )
+        return cls(data, feature_names, label_values)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.data.shape
+
+    def to_dataset(
+        self, reference: lgb.Dataset | None = None, params: dict | None = None
+    ) -> lgb.Dataset:
+        """
+        Wrap the matrix in a LightGBM Dataset without copying it.
+
+        Args:
+            reference: Training Dataset whose bins are reused (validation data)
+            params: Dataset parameters (e.g. max_bin)
+
+        Returns:
+            lgb.Dataset: Dataset over the matrix and its label
+        """
+        return lgb.Dataset(
+            self.data,
+            label=self.label,
+            feature_name=self.feature_names,
+            reference=reference,
+            params=params,
+        )
+
+    def predict(self, booster: lgb.Booster, **kwargs) -> np.ndarray:
+        """Predict with a booster trained on the same features."""
+        return booster.predict(self.data, **kwargs)
@@ -1,14 +1,18 @@
 from typing import Union
 
+import numpy as np
 import polars as pl
-from sklearn.preprocessing import LabelEncoder
 
 from src.config.preprocess import TargetEncoderConfig
 from src.features.base_encoder import BaseEncoder
-from src.features.target_encoding import TargetEncoder
+from src.features.label_encoding import LabelEncoder
+from src.features.stats import group_stats
 
 
 class PaintColorEncoder(BaseEncoder):
+    column = "paint_color"
+    _fitted_attributes = ("major_colors_",)
+
     def __init__(
         self,
         use_grouping: bool = True,
@@ -20,63 +24,54 @@ class PaintColorEncoder(BaseEncoder):
         self.use_grouping = use_grouping
         self.use_label_encoding = use_label_encoding
 
-    def fit(self, X: pl.DataFrame, y: pl.DataFrame) -> "PaintColorEncoder":
+    @property
+    def paint_color_expr(self) -> pl.Expr:
+        return (
+            pl.when(pl.col("paint_color").is_in(self.major_colors_))
+            .then(pl.col("paint_color"))
+            .otherwise(pl.lit("other_colors"))
+            .alias("paint_color")
+        )
+
+    def _fit_from_stats(self, stats: pl.DataFrame) -> "PaintColorEncoder":
         if self.use_grouping:
-            combined_df = pl.concat([X, y], how="horizontal")
-            major_colors = (
-                combined_df.group_by("paint_color")
-                .agg(pl.len().alias("count"))
-                .filter(pl.col("count") >= 500)
-                .select("paint_color")
-                .to_series()
-                .to_list()
+            self.major_colors_ = (
+                stats.filter(pl.col("count") >= 500).get_column("category").to_list()
             )
-            self.paint_color_expr = (
-                pl.when(pl.col("paint_color").is_in(major_colors))
-                .then(pl.col("paint_color"))
-                .otherwise(pl.lit("other_colors"))
-                .alias("paint_color")
-            )
-            X = X.with_columns(self.paint_color_expr)
+            stats = group_stats(stats, self.major_colors_, "other_colors")
 
         if self.use_label_encoding:
-            self.label_encoder = LabelEncoder()
-            self.label_encoder.fit(X.to_numpy().ravel())
+            self.label_encoder = LabelEncoder().fit_stats(stats)
 
         if self.use_target_encoding:
-            self.target_encoder = TargetEncoder(
-                smoothing=self.target_encoder_config.smoothing,
-                min_samples_leaf=self.target_encoder_config.min_samples_leaf,
-                noise_level=self.target_encoder_config.noise_level,
-            )
-            self.target_encoder.fit(X.select("paint_color").to_numpy(), y.to_numpy())
+            self.target_encoder = self._make_target_encoder().fit_stats(stats)
         return self
 
-    def transform(self, X: pl.DataFrame) -> pl.DataFrame:
-        result = X.clone()
+    def transform_exprs(
+        self,
+        n_rows: int,
+        add_noise: bool = True,
+        rng: np.random.Generator | None = None,
+    ) -> list[pl.Expr]:
+        exprs = []
 
-        if self.use_grouping:
-            result = result.with_columns(self.paint_color_expr)
+        paint_color = (
+            self.paint_color_expr if self.use_grouping else pl.col("paint_color")
+        )
 
         if self.use_label_encoding:
-            result = result.with_columns(
-                pl.Series(
-                    name="paint_color_label",
-                    values=self.label_encoder.transform(
-                        result.select("paint_color").to_numpy().ravel()
-                    ),
+            exprs.append(
+                self.label_encoder.transform_expr(paint_color).alias(
+                    "paint_color_label"
                 )
             )
 
         # ターゲットエンコーディング
         if self.use_target_encoding:
-            result = result.with_columns(
-                pl.Series(
-                    name="paint_color_te",
-                    values=self.target_encoder.transform(
-                        result.select("paint_color").to_numpy()
-                    ),
-                )
+            exprs.append(
+                self.target_encoder.transform_expr(
+                    paint_color, n_rows, add_noise, rng
+                ).alias("paint_color_te")
             )
 
-        return result.drop("paint_color")
+        return exprs
@@ -1,17 +1,39 @@
+import multiprocessing
+import os
+import zlib
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import TypeVar
+
+import numpy as np
 import polars as pl
 
+from src.config.preprocess import PreprocessorConfig
 from src.features.base_encoder import BaseEncoder
 from src.features.condition import ConditionEncoder
 from src.features.cylinders import CylindersEncoder
 from src.features.drive import DriveEncoder
 from src.features.fuel import FuelEncoder
+from src.features.instrumentation import Hook, Instrumentation
 from src.features.manufacturer import ManufacturerEncoder
 from src.features.paint_color import PaintColorEncoder
+from src.features.preprocess_cache import PreprocessCache
+from src.features.shards import ShardStats, merge_shard_stats, shard_stats
 from src.features.state import StateEncoder
+from src.features.stats import CategoryStatsCache, column_stats, price_window_expr
 from src.features.transmission import TransmissionEncoder
 from src.features.type import TypeEncoder
 from src.features.year import YearEncoder
 
+# Version of the on-disk layout written by Preprocessor.save
+ARTIFACT_FORMAT_VERSION = 1
+ARTIFACT_CONFIG_FILE = "preprocessor_config.yaml"
+ARTIFACT_STATE_FILE = "fitted_state.npz"
+
+T = TypeVar("T")
+
 
 class Preprocessor:
     def __init__(
@@ -29,6 +51,8 @@ class Preprocessor:
         price_upper_bound: int = 40_000,
         price_lower_bound: int = 1_000,
         remove_outliers_val: bool = True,
+        n_jobs: int = 1,
+        random_state: int | None = None,
     ):
         self.encoders: dict[str, BaseEncoder] = {
             "condition": ConditionEncoder(**(condition_encoder_config)),
@@ -48,69 +72,525 @@ class Preprocessor:
 
         self._remove_outliers_val = remove_outliers_val
 
+        # Number of threads fitting and transforming the encoders concurrently
+        # (-1 for one per CPU). Runtime setting, not part of the config
+        self.n_jobs = (os.cpu_count() or 1) if n_jobs == -1 else n_jobs
+        if self.n_jobs < 1:
+            raise ValueError("n_jobs must be a positive integer or -1.")
+
+        # Seed of the target-encoding noise (drawn from the global numpy
+        # generator at each transform if None), see _noise_generators
+        self.random_state = random_state
+
+        # Per-stage recorder, None unless instrument() was called
+        self.instrumentation: Instrumentation | None = None
+
+        self.config = PreprocessorConfig(
+            condition_encoder_config=condition_encoder_config,
+            cylinder_encoder_config=cylinder_encoder_config,
+            drive_encoder_config=drive_encoder_config,
+            fuel_encoder_config=fuel_encoder_config,
+            manufacturer_encoder_config=manufacturer_encoder_config,
+            paint_color_encoder_config=paint_color_encoder_config,
+            state_encoder_config=state_encoder_config,
+            transmission_encoder_config=transmission_encoder_config,
+            type_encoder_config=type_encoder_config,
+            year_encoder_config=year_encoder_config,
+            price_upper_bound=price_upper_bound,
+            price_lower_bound=price_lower_bound,
+            remove_outliers_val=remove_outliers_val,
+        )
+
+    def instrument(self, *hooks: Hook) -> Instrumentation:
+        """
+        Record wall time, rows/s, output size and column count of every stage.
+
+        Subsequent fit, transform and run calls record one StageRecord per
+        outlier filtering, encoder fit, encoder transform and concatenation
+        (see src.features.instrumentation). Set instrumentation to None to
+        stop recording.
+
+        Args:
+            *hooks: Callables invoked with each StageRecord when its stage ends
+
+        Returns:
+            Instrumentation: Recorder holding the report; more hooks can be
+            subscribed to it
+        """
+        self.instrumentation = Instrumentation(hooks)
+        return self.instrumentation
+
+    def fit(
+        self,
+        train_df: pl.DataFrame | pl.LazyFrame,
+        stats_cache: CategoryStatsCache | None = None,
+    ) -> "Preprocessor":
+        """
+        Fit all encoders on the training data, excluding price outliers.
+
+        With a stats_cache built on train_df, the encoders are fitted from the
+        cached per-category statistics instead of scanning the training data.
+
+        train_df may also be a LazyFrame (e.g. pl.scan_parquet of a history
+        larger than memory). The outlier filter and the per-category
+        statistics then run out of core on the streaming engine, and memory
+        is bounded by the number of categories rather than rows.
+        """
+        if stats_cache is not None:
+            self._fit_encoders_from_stats(stats_cache)
+            return self
+
+        if isinstance(train_df, pl.LazyFrame):
+            # 外れ値の除去は遅延評価のまま統計の集計に組み込む
+            train_df_excluded = self._remove_outliers(
+                train_df, self.price_upper_bound, self.price_lower_bound
+            )
+        else:
+            train_df_excluded = self._remove_outliers_measured(train_df, "train")
+        self._fit_encoders(train_df_excluded)
+        return self
+
+    def fit_shards(
+        self,
+        shards: Sequence[str | Path | pl.DataFrame],
+        n_workers: int | None = None,
+    ) -> "Preprocessor":
+        """
+        Fit all encoders on training data stored as several shards.
+
+        Every shard (a Parquet file, or a frame) is read, filtered of price
+        outliers and aggregated into mergeable statistics independently, in
+        a process pool; the merged statistics then fit the encoders. The
+        result is the same as fit on the concatenation of the shards, without
+        ever holding that concatenation in memory.
+
+        Args:
+            shards: Parquet files (or frames) of the training data
+            n_workers: Number of worker processes (n_jobs if None, -1 for one
+                per CPU); 1 aggregates the shards in this process
+        """
+        if not shards:
+            raise ValueError("shards must not be empty.")
+        n_workers = self.n_jobs if n_workers is None else n_workers
+        if n_workers == -1:
+            n_workers = os.cpu_count() or 1
+
+        stats_columns = [
+            col for col, encoder in self.encoders.items() if encoder.requires_stats
+        ]
+        aggregate = partial(
+            shard_stats,
+            columns=stats_columns,
+            median_columns=list(self._median_accuracy()),
+            median_accuracy=self._median_accuracy(),
+            price_lower_bound=self.price_lower_bound,
+            price_upper_bound=self.price_upper_bound,
+        )
+
+        def collect_stats() -> dict[str, pl.DataFrame]:
+            if n_workers == 1:
+                return merge_shard_stats(map(aggregate, shards)).column_stats()
+            # polars のスレッドプールは fork に対応しないため spawn で起動する
+            with ProcessPoolExecutor(
+                max_workers=min(n_workers, len(shards)),
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as executor:
+                results: list[ShardStats] = list(executor.map(aggregate, shards))
+            return merge_shard_stats(results).column_stats()
+
+        # 全シャードの行数は集計が終わるまで分からないため 0 とする
+        stats = self._measure("stats", "all", "train", 0, collect_stats)
+
+        def fit(col: str, encoder: BaseEncoder) -> BaseEncoder:
+            return self._measure(
+                "fit", col, "train", 0, lambda: encoder.fit_from_stats(stats[col])
+            )
+
+        # 統計を使わないエンコーダー（year）は学習データに依存しない
+        encoders = {col: self.encoders[col] for col in stats_columns}
+        self._map_encoders(fit, encoders.keys(), encoders.values())
+        return self
+
+    def partial_fit(self, batch_df: pl.DataFrame, decay: float = 1.0) -> "Preprocessor":
+        """
+        Update the fitted encoders with a new batch of training data.
+
+        Price outliers are excluded from the batch, and every encoder adds the
+        batch's per-category statistics to its stored ones (see
+        BaseEncoder.partial_fit), so the cost of the update is one pass over
+        the batch plus time proportional to the number of categories. With
+        decay < 1 the stored statistics are down-weighted before each update,
+        so that recent batches dominate.
+
+        An exact median (the default of the StateEncoder top-tier ranking)
+        can only be updated when the preprocessor was built up with
+        partial_fit from the start (partial_fit of an unfitted preprocessor
+        fits it); after fit, sketch it with median_sketch_accuracy.
+
+        Args:
+            batch_df: New training data
+            decay: Weight of the stored statistics, in (0, 1] (1 for no decay)
+        """
+        batch_df = self._remove_outliers_measured(batch_df, "train")
+        y = batch_df.select("price")
+
+        def partial_fit(col: str, encoder: BaseEncoder) -> BaseEncoder:
+            return self._measure(
+                "fit",
+                col,
+                "train",
+                batch_df.height,
+                lambda: encoder.partial_fit(batch_df.select(col), y, decay),
+            )
+
+        self._map_encoders(partial_fit, self.encoders.keys(), self.encoders.values())
+        return self
+
+    def transform(
+        self, df: pl.DataFrame, add_noise: bool = True, split: str = "data"
+    ) -> pl.DataFrame:
+        """
+        Transform a dataframe with the fitted encoders.
+
+        Pass add_noise=False when scoring, so target encodings are deterministic.
+        The price column is optional and passed through when present.
+
+        With a random_state, the target-encoding noise depends only on the
+        random_state, the encoder and split (run uses "train", "val" and
+        "test"): the same frame transformed under the same split name gets the
+        same noise, whatever transforms ran before, on any thread, and after
+        save/load. Pass distinct split names for distinct frames.
+        """
+        return self._transform(df, add_noise, split)
+
+    def save(self, path: str | Path) -> None:
+        """
+        Save the fitted preprocessor as an artifact directory.
+
+        The directory holds the PreprocessorConfig as YAML and the fitted state
+        of every encoder (grouping lists, label vocabularies, target-encoding
+        tables, top-state lists) as a single uncompressed npz file.
+        """
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+
+        self.config.to_yaml(path / ARTIFACT_CONFIG_FILE)
+
+        arrays = {
+            "format_version": np.asarray(ARTIFACT_FORMAT_VERSION),
+            **self.get_fitted_state(),
+        }
+        if self.random_state is not None:
+            arrays["random_state"] = np.asarray(self.random_state)
+        np.savez(path / ARTIFACT_STATE_FILE, **arrays)
+
+    @classmethod
+    def load(cls, path: str | Path) -> "Preprocessor":
+        """Load a fitted preprocessor saved by Preprocessor.save."""
+        path = Path(path)
+
+        config = PreprocessorConfig.from_yaml(path / ARTIFACT_CONFIG_FILE)
+
+        with np.load(path / ARTIFACT_STATE_FILE, allow_pickle=False) as arrays:
+            format_version = int(arrays["format_version"])
+            if format_version != ARTIFACT_FORMAT_VERSION:
+                raise ValueError(
+                    f"Unsupported preprocessor artifact version {format_version}, "
+                    f"expected {ARTIFACT_FORMAT_VERSION}."
+                )
+
+            # Seed of the noise of the saved preprocessor, if any
+            random_state = (
+                int(arrays["random_state"]) if "random_state" in arrays.files else None
+            )
+            preprocessor = cls(**config.to_dict(), random_state=random_state)
+            preprocessor.set_fitted_state({key: arrays[key] for key in arrays.files})
+
+        return preprocessor
+
+    def get_fitted_state(self) -> dict[str, np.ndarray]:
+        """Fitted state of every encoder, prefixed by the encoder's column."""
+        state = {}
+        for col, encoder in self.encoders.items():
+            for key, value in encoder.get_fitted_state().items():
+                state[f"{col}.{key}"] = value
+        return state
+
+    def set_fitted_state(self, state: dict[str, np.ndarray]) -> "Preprocessor":
+        """Restore the fitted state exported by get_fitted_state."""
+        for col, encoder in self.encoders.items():
+            prefix = f"{col}."
+            encoder.set_fitted_state(
+                {
+                    key.removeprefix(prefix): value
+                    for key, value in state.items()
+                    if key.startswith(prefix)
+                }
+            )
+        return self
+
     def run(
-        self, train_df: pl.DataFrame, val_df: pl.DataFrame, test_df: pl.DataFrame
+        self,
+        train_df: pl.DataFrame,
+        val_df: pl.DataFrame,
+        test_df: pl.DataFrame,
+        stats_cache: CategoryStatsCache | None = None,
+        cache: PreprocessCache | None = None,
+    ) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
+        """
+        Fit the encoders on the training data and transform the three splits.
+
+        With a cache, a run with the same configuration, random_state, input
+        data and code is read back from disk (memory-mapped) together with the
+        fitted state of the encoders, instead of being recomputed; a new run
+        is stored in the cache (see src.features.preprocess_cache). Caching
+        requires a random_state: an unseeded run draws fresh target-encoding
+        noise, which a cache hit would silently replace by an earlier draw.
+        """
+        if cache is None:
+            return self._run(train_df, val_df, test_df, stats_cache)
+        if self.random_state is None:
+            raise ValueError("A cached run requires an integer random_state.")
+
+        key = cache.key(self.config, self.random_state, (train_df, val_df, test_df))
+        hit = cache.get(key)
+        if hit is not None:
+            frames, state = hit
+            self.set_fitted_state(state)
+            return frames
+
+        frames = self._run(train_df, val_df, test_df, stats_cache)
+        cache.put(key, frames, self.get_fitted_state())
+        return frames
+
+    def _run(
+        self,
+        train_df: pl.DataFrame,
+        val_df: pl.DataFrame,
+        test_df: pl.DataFrame,
+        stats_cache: CategoryStatsCache | None = None,
     ) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
         # Exclude outliers from the training data
-        train_df_excluded = self._remove_outliers(
-            train_df, self.price_upper_bound, self.price_lower_bound
-        )
+        train_df_excluded = self._remove_outliers_measured(train_df, "train")
 
         if self._remove_outliers_val:
             # Exclude outliers from the validation and test data
-            val_df = self._remove_outliers(
-                val_df, self.price_upper_bound, self.price_lower_bound
-            )
+            val_df = self._remove_outliers_measured(val_df, "val")
 
         # feature engineering
         train_df_preprocessed, val_df_preprocessed, test_df_preprocessed = (
-            self._feature_engineering(train_df_excluded, val_df, test_df)
+            self._feature_engineering(train_df_excluded, val_df, test_df, stats_cache)
         )
 
         return train_df_preprocessed, val_df_preprocessed, test_df_preprocessed
 
-    def _fit_encoders(self, train_df: pl.DataFrame) -> None:
-        # Fit all encoders on the training data
-        for col, encoder in self.encoders.items():
-            encoder.fit(train_df.select(col), train_df.select("price"))
+    def _fit_encoders(self, train_df: pl.DataFrame | pl.LazyFrame) -> None:
+        # Aggregate the price per category of every column in one shared pass,
+        # then fit the encoders from their column's statistics. The row count
+        # of a LazyFrame is unknown here and recorded as 0
+        n_rows = train_df.height if isinstance(train_df, pl.DataFrame) else 0
+        stats_columns = [
+            col for col, encoder in self.encoders.items() if encoder.requires_stats
+        ]
+        stats = self._measure(
+            "stats",
+            "all",
+            "train",
+            n_rows,
+            lambda: column_stats(
+                train_df,
+                stats_columns,
+                median_columns=list(self._median_accuracy()),
+                median_accuracy=self._median_accuracy(),
+            ),
+        )
 
-    def _transform(self, df: pl.DataFrame) -> pl.DataFrame:
-        # Transform the dataframe using the fitted encoders
-        encoded_dfs = []
-        for col, encoder in self.encoders.items():
-            encoded_df = encoder.transform(df.select(col))
-            encoded_dfs.append(encoded_df)
+        def fit(col: str, encoder: BaseEncoder) -> BaseEncoder:
+            if encoder.requires_stats:
+                return self._measure(
+                    "fit",
+                    col,
+                    "train",
+                    n_rows,
+                    lambda: encoder.fit_from_stats(stats[col]),
+                )
+            return self._measure(
+                "fit",
+                col,
+                "train",
+                n_rows,
+                lambda: encoder.fit(train_df.select(col), train_df.select("price")),
+            )
+
+        self._map_encoders(fit, self.encoders.keys(), self.encoders.values())
+
+    def _fit_encoders_from_stats(self, stats_cache: CategoryStatsCache) -> None:
+        # Fit all encoders from the cached statistics of the training data
+        def fit(col: str, encoder: BaseEncoder) -> BaseEncoder:
+            return self._measure(
+                "fit",
+                col,
+                "train",
+                stats_cache.train_df.height,
+                lambda: encoder.fit_from_stats(
+                    stats_cache.get(
+                        col,
+                        self.price_lower_bound,
+                        self.price_upper_bound,
+                        median=encoder.requires_median,
+                        median_accuracy=encoder.median_accuracy,
+                    )
+                ),
+            )
+
+        encoders = {
+            col: encoder
+            for col, encoder in self.encoders.items()
+            if encoder.requires_stats
+        }
+        self._map_encoders(fit, encoders.keys(), encoders.values())
+
+    def _median_accuracy(self) -> dict[str, float | None]:
+        # Columns fitted from the median target, with the relative accuracy
+        # of their sketched median (None for the exact median)
+        return {
+            col: encoder.median_accuracy
+            for col, encoder in self.encoders.items()
+            if encoder.requires_stats and encoder.requires_median
+        }
+
+    def _map_encoders(self, fn: Callable[..., T], *iterables) -> list[T]:
+        # Apply fn to every encoder, on a thread pool when n_jobs > 1. The
+        # encoders are independent and polars and numpy release the GIL
+        if self.n_jobs == 1:
+            return list(map(fn, *iterables))
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            return list(executor.map(fn, *iterables))
+
+    def _noise_generators(self, split: str) -> list[np.random.Generator]:
+        # One independent generator per encoder, derived from (random_state,
+        # encoder index, split) without mutating any state, so the noise does
+        # not depend on n_jobs, on earlier transforms or on other threads
+        entropy = self.random_state
+        if entropy is None:
+            entropy = np.random.randint(np.iinfo(np.int64).max)
+        split_key = zlib.crc32(split.encode())
+        return [
+            np.random.default_rng(
+                np.random.SeedSequence(entropy, spawn_key=(index, split_key))
+            )
+            for index in range(len(self.encoders))
+        ]
+
+    def _measure(
+        self, stage: str, name: str, split: str, rows: int, fn: Callable[[], T]
+    ) -> T:
+        # Run one stage, recording it when instrumentation is enabled
+        if self.instrumentation is None:
+            return fn()
+        return self.instrumentation.measure(stage, name, split, rows, fn)
+
+    def _remove_outliers_measured(self, df: pl.DataFrame, split: str) -> pl.DataFrame:
+        return self._measure(
+            "remove_outliers",
+            "all",
+            split,
+            df.height,
+            lambda: self._remove_outliers(
+                df, self.price_upper_bound, self.price_lower_bound
+            ),
+        )
+
+    def _transform(
+        self, df: pl.DataFrame, add_noise: bool = True, split: str = "data"
+    ) -> pl.DataFrame:
+        passthrough = [col for col in ["price", "odometer"] if col in df.columns]
+        rngs = (
+            self._noise_generators(split) if add_noise else [None] * len(self.encoders)
+        )
+        if self.instrumentation is not None:
+            return self._transform_instrumented(df, add_noise, split, passthrough, rngs)
+
+        # Build every encoder's output as part of a single lazy plan, so the
+        # feature frame is materialized once by one collect(). Building the
+        # expressions (which draws the noise) runs concurrently with n_jobs
+        def encode_exprs(
+            encoder: BaseEncoder, rng: np.random.Generator | None
+        ) -> list[pl.Expr]:
+            return encoder.encode_exprs(df.schema, df.height, add_noise, rng)
 
-        encoded_df = pl.concat(encoded_dfs, how="horizontal")
+        exprs = [pl.col(col) for col in passthrough]
+        for encoder_exprs in self._map_encoders(
+            encode_exprs, self.encoders.values(), rngs
+        ):
+            exprs.extend(encoder_exprs)
 
-        transformed_df = pl.concat(
-            [df.select(["price", "odometer"]), encoded_df], how="horizontal"
+        return df.lazy().select(exprs).collect()
+
+    def _transform_instrumented(
+        self,
+        df: pl.DataFrame,
+        add_noise: bool,
+        split: str,
+        passthrough: list[str],
+        rngs: list[np.random.Generator | None],
+    ) -> pl.DataFrame:
+        # Collect each encoder's output separately so that its cost can be
+        # attributed, then concatenate (same frame as the fused plan)
+        lazy_df = df.lazy()
+
+        def transform(
+            col: str, encoder: BaseEncoder, rng: np.random.Generator | None
+        ) -> pl.DataFrame:
+            return self._measure(
+                "transform",
+                col,
+                split,
+                df.height,
+                lambda: lazy_df.select(
+                    encoder.encode_exprs(df.schema, df.height, add_noise, rng)
+                ).collect(),
+            )
+
+        frames = [df.select(passthrough)]
+        frames.extend(
+            self._map_encoders(
+                transform, self.encoders.keys(), self.encoders.values(), rngs
+            )
+        )
+
+        return self._measure(
+            "concat",
+            "all",
+            split,
+            df.height,
+            lambda: pl.concat(frames, how="horizontal"),
         )
-        return transformed_df
 
     def _feature_engineering(
         self,
         train_df: pl.DataFrame,
         val_df: pl.DataFrame,
         test_df: pl.DataFrame,
+        stats_cache: CategoryStatsCache | None = None,
     ) -> tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]:
         # fit encoders
-        self._fit_encoders(train_df)
+        if stats_cache is not None:
+            self._fit_encoders_from_stats(stats_cache)
+        else:
+            self._fit_encoders(train_df)
 
         # transform dataframes
-        train_df_transformed = self._transform(train_df)
-        val_df_transformed = self._transform(val_df)
-        test_df_transformed = self._transform(test_df)
+        train_df_transformed = self._transform(train_df, split="train")
+        val_df_transformed = self._transform(val_df, split="val")
+        test_df_transformed = self._transform(test_df, split="test")
 
         return train_df_transformed, val_df_transformed, test_df_transformed
 
     def _remove_outliers(
         self,
-        df: pl.DataFrame,
+        df: pl.DataFrame | pl.LazyFrame,
         price_upper_bound: int = 40_000,
         price_lower_bound: int = 1_000,
-    ) -> pl.DataFrame:
-        return df.filter(
-            (pl.col("price") < price_upper_bound)
-            & (pl.col("price") > price_lower_bound)
-        )
+    ) -> pl.DataFrame | pl.LazyFrame:
+        return df.filter(price_window_expr(price_lower_bound, price_upper_bound))
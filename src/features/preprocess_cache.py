@@ -0,0 +1,213 @@
+"""
+Content-addressed on-disk cache of preprocessed splits.
+
+Preprocessor.run(..., cache=PreprocessCache()) looks up the output of the run
+under a key made of:
+
+- the PreprocessorConfig (with every nested encoder and target-encoding
+  configuration) and the random_state of the noise
+- a fingerprint of the contents of the three input frames
+- the code version: the sources of the feature, configuration and data
+  modules (the schema the splits are cast to) and the versions of polars and
+  numpy
+
+On a miss the run is computed and its three output frames are stored as
+uncompressed Arrow IPC files, together with the fitted state of the
+Preprocessor. On a hit the frames are memory-mapped back and the fitted
+state is restored, so the Preprocessor can transform new data as after a
+real run. Entries are evicted least recently used first once the cache
+exceeds its size budget.
+
+Only seeded runs are cached: with random_state=None the target-encoding noise
+differs between runs, and a hit would return the noise of an earlier run.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from functools import cache
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from src.config.preprocess import PreprocessorConfig
+from src.data.cache import DATASET_DIR
+
+# Bump when the layout of an entry changes, to invalidate existing entries
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_CACHE_DIR = DATASET_DIR / ".cache" / "preprocessed"
+DEFAULT_MAX_BYTES = 4 * 1024**3
+
+SPLIT_FILES = ("train.arrow", "val.arrow", "test.arrow")
+STATE_FILE = "fitted_state.npz"
+
+# Packages whose code determines the preprocessing output
+_SOURCE_DIRS = [
+    Path(__file__).resolve().parent,
+    Path(__file__).resolve().parents[1] / "config",
+    Path(__file__).resolve().parents[1] / "data",
+]
+
+
+@cache
+def code_version() -> str:
+    """Hash of the preprocessing code and of the libraries it depends on."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((CACHE_FORMAT_VERSION, pl.__version__, np.__version__)).encode())
+    for source_dir in _SOURCE_DIRS:
+        for path in sorted(source_dir.glob("*.py")):
+            digest.update(f"{source_dir.name}/{path.name}".encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def frame_fingerprint(df: pl.DataFrame) -> str:
+    """Content hash of a frame (schema and values)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((df.height, list(df.schema.items()))).encode())
+    if df.height > 0 and df.width > 0:
+        digest.update(df.hash_rows(seed=0, seed_1=1, seed_2=2, seed_3=3).to_numpy())
+    return digest.hexdigest()
+
+
+def config_fingerprint(config: PreprocessorConfig) -> str:
+    """Hash of a PreprocessorConfig, including the nested encoder configs."""
+    dumped = json.dumps(config.model_dump(mode="json"), sort_keys=True)
+    return hashlib.blake2b(dumped.encode(), digest_size=16).hexdigest()
+
+
+class PreprocessCache:
+    """
+    On-disk cache of the outputs of Preprocessor.run.
+
+    Args:
+        cache_dir: Directory of the cache entries
+        max_bytes: Size budget of the cache; least recently used entries are
+            evicted beyond it (the newest entry is always kept)
+    """
+
+    def __init__(
+        self,
+        cache_dir: str | Path = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def key(
+        self,
+        config: PreprocessorConfig,
+        random_state: int,
+        frames: tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame],
+    ) -> str:
+        """
+        Cache key of a run.
+
+        Args:
+            config: Configuration of the Preprocessor
+            random_state: Seed of the target-encoding noise
+            frames: Train, validation and test inputs
+
+        Returns:
+            str: Hex digest identifying the run
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(code_version().encode())
+        digest.update(config_fingerprint(config).encode())
+        digest.update(repr(random_state).encode())
+        for df in frames:
+            digest.update(frame_fingerprint(df).encode())
+        return digest.hexdigest()
+
+    def get(
+        self, key: str
+    ) -> tuple[tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame], dict] | None:
+        """
+        Look up a run.
+
+        Args:
+            key: Cache key (see key)
+
+        Returns:
+            The memory-mapped train, validation and test outputs and the fitted
+            state of the Preprocessor, or None on a miss
+        """
+        entry = self.cache_dir / key
+        if not entry.is_dir():
+            return None
+
+        # The modification time of an entry orders the LRU eviction
+        os.utime(entry)
+        train_df, val_df, test_df = (
+            pl.read_ipc(entry / name, memory_map=True) for name in SPLIT_FILES
+        )
+        with np.load(entry / STATE_FILE, allow_pickle=False) as arrays:
+            state = {name: arrays[name] for name in arrays.files}
+        return (train_df, val_df, test_df), state
+
+    def put(
+        self,
+        key: str,
+        frames: tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame],
+        state: dict[str, np.ndarray],
+    ) -> None:
+        """
+        Store the outputs and fitted state of a run, then evict beyond budget.
+
+        Args:
+            key: Cache key (see key)
+            frames: Train, validation and test outputs
+            state: Fitted state of the Preprocessor
+        """
+        entry = self.cache_dir / key
+        # Write to a temporary directory first so that a concurrent reader
+        # never sees a partially written entry
+        tmp_entry = self.cache_dir / f".{key}.{os.getpid()}.tmp"
+        tmp_entry.mkdir(parents=True, exist_ok=True)
+        for df, name in zip(frames, SPLIT_FILES):
+            df.write_ipc(tmp_entry / name, compression="uncompressed")
+        np.savez(tmp_entry / STATE_FILE, **state)
+        try:
+            os.replace(tmp_entry, entry)
+        except OSError:
+            # Another process has written the same entry first
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+        self._evict(keep=key)
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def size(self) -> int:
+        """Total size of the entries in bytes."""
+        return sum(size for _, _, size in self._entries())
+
+    def _entries(self) -> list[tuple[float, Path, int]]:
+        # (last access time, path, size) of every entry, least recent first
+        if not self.cache_dir.is_dir():
+            return []
+        entries = []
+        for entry in self.cache_dir.iterdir():
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            try:
+                size = sum(path.stat().st_size for path in entry.iterdir())
+                entries.append((entry.stat().st_mtime, entry, size))
+            except FileNotFoundError:
+                # Evicted by another process meanwhile
+                continue
+        return sorted(entries)
+
+    def _evict(self, keep: str) -> None:
+        entries = self._entries()
+        total = sum(size for _, _, size in entries)
+        for _, entry, size in entries:
+            if total <= self.max_bytes:
+                break
+            if entry.name == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
@@ -0,0 +1,192 @@
+"""
+Mergeable encoder statistics for fitting the Preprocessor on data shards.
+
+The fitted state of every encoder is a function of per-category statistics
+of its column (see src.features.stats). ShardStats holds those statistics in a
+mergeable form for some training rows:
+
+- per category: row count, sum and sum of squares of the price
+- for the columns whose encoder ranks categories by median price: the row
+  count of every (category, price) pair, from which the exact median follows,
+  or the quantile sketch of the price if the median is sketched (see
+  src.features.stats.sketch_stats)
+
+Shards are aggregated independently (in a process pool by
+Preprocessor.fit_shards, or on other machines) and combined with
+ShardStats.merge. Since every statistic is a sum over rows, merging in any
+order gives the statistics of the concatenated shards, and the encoders
+fitted from them are the same as with a single fit. Prices are integers, so
+the sums are exact in float64.
+
+The memory of the per-price counts grows with the number of distinct prices
+per category, not with the number of rows; that of a sketch is bounded by its
+accuracy.
+"""
+
+from collections.abc import Collection, Iterable, Mapping, Sequence
+from dataclasses import dataclass, field
+from functools import reduce
+from pathlib import Path
+
+import polars as pl
+
+from src.features.stats import (
+    column_stats,
+    median_from_value_counts,
+    merge_stats,
+    price_window_expr,
+    value_counts,
+)
+
+
+@dataclass
+class ShardStats:
+    """
+    Mergeable per-category statistics of the encoder columns.
+
+    Args:
+        stats: Per column, category, count, sum and sum_sq of the target (and
+            sketch and median for a sketched median)
+        value_counts: Per exact-median column, value_counts output (category,
+            value and count)
+        rows: Number of aggregated rows
+    """
+
+    stats: dict[str, pl.DataFrame]
+    value_counts: dict[str, pl.DataFrame] = field(default_factory=dict)
+    rows: int = 0
+
+    @classmethod
+    def from_frame(
+        cls,
+        df: pl.DataFrame,
+        columns: Sequence[str],
+        median_columns: Collection[str] = (),
+        target: str = "price",
+        median_accuracy: Mapping[str, float | None] | None = None,
+    ) -> "ShardStats":
+        """
+        Aggregate the statistics of one shard.
+
+        Args:
+            df: Training rows of the shard (outliers already excluded)
+            columns: Categorical columns to aggregate
+            median_columns: Columns whose median target per category is needed
+            target: Target column
+            median_accuracy: Relative accuracy of the sketched median of some
+                median columns; exact for the others
+
+        Returns:
+            ShardStats: Statistics of the shard
+        """
+        median_accuracy = median_accuracy or {}
+        sketched = [
+            col for col in median_columns if median_accuracy.get(col) is not None
+        ]
+        return cls(
+            stats=column_stats(
+                df,
+                columns,
+                target,
+                median_columns=sketched,
+                median_accuracy=median_accuracy,
+            ),
+            value_counts={
+                col: value_counts(df.get_column(col), df.get_column(target))
+                for col in median_columns
+                if col not in sketched
+            },
+            rows=df.height,
+        )
+
+    def merge(self, other: "ShardStats") -> "ShardStats":
+        """
+        Combine with the statistics of other rows.
+
+        Args:
+            other: Statistics of other rows, of the same columns
+
+        Returns:
+            ShardStats: Statistics of the rows of both
+        """
+        if self.stats.keys() != other.stats.keys() or (
+            self.value_counts.keys() != other.value_counts.keys()
+        ):
+            raise ValueError("Cannot merge statistics of different columns.")
+
+        return ShardStats(
+            stats={
+                col: merge_stats(stats, other.stats[col])
+                for col, stats in self.stats.items()
+            },
+            value_counts={
+                col: pl.concat([counts, other.value_counts[col]])
+                .group_by("category", "value")
+                .agg(pl.col("count").sum())
+                for col, counts in self.value_counts.items()
+            },
+            rows=self.rows + other.rows,
+        )
+
+    def column_stats(self) -> dict[str, pl.DataFrame]:
+        """
+        Statistics per column in the format of column_stats.
+
+        Returns:
+            dict[str, pl.DataFrame]: Per column, category, count, sum, sum_sq
+            (and the exact median for the median columns), sorted by category
+        """
+        stats = dict(self.stats)
+        for col, counts in self.value_counts.items():
+            stats[col] = stats[col].join(
+                median_from_value_counts(counts),
+                on="category",
+                how="left",
+                nulls_equal=True,
+                maintain_order="left",
+            )
+        return stats
+
+
+def merge_shard_stats(shards: Iterable[ShardStats]) -> ShardStats:
+    """Merge the statistics of several shards (at least one)."""
+    return reduce(ShardStats.merge, shards)
+
+
+def shard_stats(
+    shard: str | Path | pl.DataFrame,
+    columns: Sequence[str],
+    median_columns: Collection[str],
+    price_lower_bound: float,
+    price_upper_bound: float,
+    median_accuracy: Mapping[str, float | None] | None = None,
+) -> ShardStats:
+    """
+    Read one shard, exclude price outliers and aggregate its statistics.
+
+    Module-level so that it can run in a worker process.
+
+    Args:
+        shard: Parquet file of the shard, or the shard itself
+        columns: Categorical columns to aggregate
+        median_columns: Columns whose median target per category is needed
+        price_lower_bound: Exclusive lower bound of the price
+        price_upper_bound: Exclusive upper bound of the price
+        median_accuracy: Relative accuracy of the sketched median of some
+            median columns; exact for the others
+
+    Returns:
+        ShardStats: Statistics of the shard
+    """
+    if isinstance(shard, pl.DataFrame):
+        df = shard.lazy()
+    else:
+        df = pl.scan_parquet(shard)
+    df = (
+        df.select(*columns, "price")
+        .filter(price_window_expr(price_lower_bound, price_upper_bound))
+        .collect()
+    )
+    return ShardStats.from_frame(
+        df, columns, median_columns, median_accuracy=median_accuracy
+    )
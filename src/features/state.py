@@ -1,14 +1,18 @@
 from typing import Union
 
+import numpy as np
 import polars as pl
-from sklearn.preprocessing import LabelEncoder
 
 from src.config.preprocess import TargetEncoderConfig
 from src.features.base_encoder import BaseEncoder
-from src.features.target_encoding import TargetEncoder
+from src.features.label_encoding import LabelEncoder
+from src.features.stats import group_stats
 
 
 class StateEncoder(BaseEncoder):
+    column = "state"
+    _fitted_attributes = ("major_states_", "top_states_")
+
     def __init__(
         self,
         use_grouping: bool = True,
@@ -16,89 +20,86 @@ class StateEncoder(BaseEncoder):
         use_label_encoding: bool = True,
         use_target_encoding: bool = True,
         target_encoder_config: Union[TargetEncoderConfig, None] = None,
+        median_sketch_accuracy: Union[float, None] = None,
     ):
         super().__init__(use_target_encoding, target_encoder_config)
         self.use_grouping = use_grouping
         self.use_top_tier_flag = use_top_tier_flag
         self.use_label_encoding = use_label_encoding
+        self.median_sketch_accuracy = median_sketch_accuracy
 
-    def fit(self, X: pl.DataFrame, y: pl.DataFrame) -> "StateEncoder":
-        combined_df = pl.concat([X, y], how="horizontal")
-        if self.use_grouping:
-            major_states = (
-                combined_df.group_by("state")
-                .agg(pl.len().alias("count"))
-                .filter(pl.col("count") >= 300)
-                .select("state")
-                .to_series()
-                .to_list()
-            )
-            self.state_expr = (
-                pl.when(pl.col("state").is_in(major_states))
-                .then(pl.col("state"))
-                .otherwise(pl.lit("other_states"))
-                .alias("state")
-            )
-            X = X.with_columns(self.state_expr)
+    @property
+    def state_expr(self) -> pl.Expr:
+        return (
+            pl.when(pl.col("state").is_in(self.major_states_))
+            .then(pl.col("state"))
+            .otherwise(pl.lit("other_states"))
+            .alias("state")
+        )
+
+    @property
+    def top_states_expr(self) -> pl.Expr:
+        return (
+            pl.when(pl.col("state").is_in(self.top_states_))
+            .then(1)
+            .otherwise(0)
+            .alias("is_top_10_state")
+        )
+
+    @property
+    def requires_median(self) -> bool:
+        return self.use_top_tier_flag
+
+    @property
+    def median_accuracy(self) -> Union[float, None]:
+        # 上位フラグの価格中央値をスケッチで近似する場合の相対精度
+        return self.median_sketch_accuracy
 
+    def _fit_from_stats(self, stats: pl.DataFrame) -> "StateEncoder":
+        # 上位フラグはグルーピング前の州の価格中央値で決める
         if self.use_top_tier_flag:
-            top_states = (
-                combined_df.group_by("state")
-                .agg(pl.median("price").alias("median_price"))
-                .sort("median_price", descending=True)
+            self.top_states_ = (
+                stats.sort(["median", "category"], descending=[True, False])
                 .head(10)
-                .select("state")
-                .to_series()
+                .get_column("category")
                 .to_list()
             )
-            self.top_states_expr = (
-                pl.when(pl.col("state").is_in(top_states))
-                .then(1)
-                .otherwise(0)
-                .alias("is_top_10_state")
+
+        if self.use_grouping:
+            self.major_states_ = (
+                stats.filter(pl.col("count") >= 300).get_column("category").to_list()
             )
-            X = X.with_columns(self.top_states_expr)
+            stats = group_stats(stats, self.major_states_, "other_states")
 
         if self.use_label_encoding:
-            self.label_encoder = LabelEncoder()
-            self.label_encoder.fit(X.select("state").to_numpy().ravel())
+            self.label_encoder = LabelEncoder().fit_stats(stats)
 
         if self.use_target_encoding:
-            self.target_encoder = TargetEncoder(
-                smoothing=self.target_encoder_config.smoothing,
-                min_samples_leaf=self.target_encoder_config.min_samples_leaf,
-                noise_level=self.target_encoder_config.noise_level,
-            )
-            self.target_encoder.fit(X.select("state").to_numpy(), y.to_numpy())
+            self.target_encoder = self._make_target_encoder().fit_stats(stats)
         return self
 
-    def transform(self, X: pl.DataFrame) -> pl.DataFrame:
-        result = X.clone()
+    def transform_exprs(
+        self,
+        n_rows: int,
+        add_noise: bool = True,
+        rng: np.random.Generator | None = None,
+    ) -> list[pl.Expr]:
+        exprs = []
+        # 上位フラグはグルーピング前の州で判定する
         if self.use_top_tier_flag:
-            result = result.with_columns(self.top_states_expr)
+            exprs.append(self.top_states_expr)
 
-        if self.use_grouping:
-            result = result.with_columns(self.state_expr)
+        state = self.state_expr if self.use_grouping else pl.col("state")
 
         if self.use_label_encoding:
-            result = result.with_columns(
-                pl.Series(
-                    name="state_label",
-                    values=self.label_encoder.transform(
-                        result.select("state").to_numpy().ravel()
-                    ),
-                )
-            )
+            exprs.append(self.label_encoder.transform_expr(state).alias("state_label"))
 
         # ターゲットエンコーディング
         if self.use_target_encoding:
-            result = result.with_columns(
-                pl.Series(
-                    name="state_te",
-                    values=self.target_encoder.transform(
-                        result.select("state").to_numpy()
-                    ),
+            exprs.append(
+                self.target_encoder.transform_expr(state, n_rows, add_noise, rng).alias(
+                    "state_te"
                 )
             )
 
-        return result.drop("state")
+        return exprs
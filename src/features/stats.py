@@ -0,0 +1,694 @@
+"""
+Per-category statistics of the target used to fit the encoders.
+
+Every encoder's fitted state (grouping lists, label vocabularies, target
+encodings, top-tier lists) is a function of these statistics, so encoders
+are fitted from one group_by per column instead of repeated scans.
+"""
+
+import math
+from collections.abc import Collection, Mapping, Sequence
+
+import numpy as np
+import polars as pl
+
+# Relative rounding error tolerated on sums of decayed (non-integer) counts
+_COUNT_RTOL = 1e-9
+
+
+def category_stats(
+    category: pl.Series,
+    target: pl.Series,
+    median: bool = False,
+    median_accuracy: float | None = None,
+    mergeable_median: bool = False,
+) -> pl.DataFrame:
+    """
+    Aggregate the target per category.
+
+    Grouping runs on the physical codes for Enum/Categorical columns; only the
+    aggregated categories are converted to strings.
+
+    Args:
+        category: Categorical column
+        target: Target values (price)
+        median: Whether to also compute the median target per category
+        median_accuracy: Relative accuracy of a sketched median (see
+            sketch_stats); the median is exact if None
+        mergeable_median: Whether to keep the exact value counts of an exact
+            median as its sketch, so that merge_stats merges it exactly
+
+    Returns:
+        pl.DataFrame: Columns category, count, sum (and median, plus sketch for
+        a sketched or mergeable median), sorted by category
+    """
+    sketched = median and (median_accuracy is not None or mergeable_median)
+    aggs = [pl.len().alias("count"), pl.col("target").sum().alias("sum")]
+    if median and not sketched:
+        aggs.append(pl.col("target").median().alias("median"))
+
+    stats = (
+        pl.DataFrame(
+            [category.alias("category"), target.cast(pl.Float64).alias("target")]
+        )
+        .group_by("category")
+        .agg(aggs)
+        .with_columns(pl.col("category").cast(pl.String))
+        .sort("category")
+    )
+    if sketched:
+        stats = _join_category(
+            stats, sketch_stats(value_counts(category, target, median_accuracy))
+        )
+    return stats
+
+
+def column_stats(
+    df: pl.DataFrame | pl.LazyFrame,
+    columns: Sequence[str],
+    target: str = "price",
+    median_columns: Collection[str] = (),
+    median_accuracy: Mapping[str, float | None] | None = None,
+) -> dict[str, pl.DataFrame]:
+    """
+    Aggregate the target per category of several columns in one lazy query.
+
+    The per-column group_bys share one projection of the frame (the target is
+    cast once) and are collected together, in parallel, by pl.collect_all
+    instead of one scan per encoder. An in-memory frame is projected eagerly,
+    which copies no column.
+
+    A LazyFrame (e.g. pl.scan_parquet of data larger than memory) is instead
+    collected query by query with the streaming engine, since collect_all
+    materializes the shared input. The source is then scanned once per query,
+    but the memory of the aggregations is bounded by the number of groups
+    instead of rows. The exact median, which is not a streaming aggregation,
+    is computed by streaming_median; a sketched median is a streaming
+    aggregation of its own.
+
+    Args:
+        df: Training data
+        columns: Categorical columns to aggregate
+        target: Target column
+        median_columns: Columns whose median target per category is also needed
+        median_accuracy: Relative accuracy of the sketched median of some
+            median columns (see sketch_stats); exact for the others
+
+    Returns:
+        dict[str, pl.DataFrame]: Per column, the category_stats output with an
+        additional sum_sq column (sum of squared targets)
+    """
+    streaming = isinstance(df, pl.LazyFrame)
+    targets = df.select(*columns, pl.col(target).cast(pl.Float64)).lazy()
+    accuracies = {
+        col: accuracy
+        for col, accuracy in (median_accuracy or {}).items()
+        if col in median_columns and accuracy is not None
+    }
+    exact_median_columns = [col for col in median_columns if col not in accuracies]
+
+    queries = []
+    for col in columns:
+        aggs = [
+            pl.len().alias("count"),
+            pl.col(target).sum().alias("sum"),
+            pl.col(target).pow(2).sum().alias("sum_sq"),
+        ]
+        if col in exact_median_columns and not streaming:
+            aggs.append(pl.col(target).median().alias("median"))
+        queries.append(
+            targets.group_by(pl.col(col).alias("category"))
+            .agg(aggs)
+            .with_columns(pl.col("category").cast(pl.String))
+            .sort("category")
+        )
+    # スケッチは (カテゴリ, 丸めた値) ごとの件数から作る
+    queries.extend(
+        _value_counts_query(targets, col, target, accuracy)
+        for col, accuracy in accuracies.items()
+    )
+
+    if streaming:
+        results = [query.collect(engine="streaming") for query in queries]
+    else:
+        results = pl.collect_all(queries)
+    stats = dict(zip(columns, results))
+    for col, counts in zip(accuracies, results[len(columns) :]):
+        stats[col] = _join_category(stats[col], sketch_stats(counts))
+
+    if streaming:
+        for col in exact_median_columns:
+            stats[col] = _join_category(
+                stats[col], streaming_median(targets, col, target)
+            )
+    return stats
+
+
+def _join_category(stats: pl.DataFrame, other: pl.DataFrame) -> pl.DataFrame:
+    # カテゴリ順を保ったまま、欠損カテゴリ同士も対応させて列を追加する
+    return stats.join(
+        other, on="category", how="left", nulls_equal=True, maintain_order="left"
+    )
+
+
+def streaming_median(df: pl.LazyFrame, column: str, target: str) -> pl.DataFrame:
+    """
+    Exact median of the target per category, in two streaming passes.
+
+    The first pass counts the targets of every category in buckets of a
+    monotone, logarithmic scale (64 buckets per doubling), which locates the
+    buckets holding the middle positions. The second pass counts the distinct
+    targets of those buckets only. Memory is bounded by the number of
+    categories times the number of buckets, whatever the number of rows.
+
+    Gives the same result as the median of the raw values (the mean of the two
+    middle values for an even count).
+
+    Args:
+        df: Data with the categorical and target columns
+        column: Categorical column
+        target: Target column
+
+    Returns:
+        pl.DataFrame: Columns category (as string) and median
+    """
+    values = df.filter(pl.col(target).is_not_null()).select(
+        pl.col(column).alias("category"), pl.col(target).alias("value")
+    )
+    value = pl.col("value")
+    bucket = (value.sign() * (value.abs() + 1).log(2).mul(64).floor()).alias("bucket")
+
+    # 0始まりで (n-1)//2 番目と n//2 番目の値の平均
+    n = pl.col("count").sum().over("category")
+    lower, upper = (n - 1) // 2, n // 2
+    buckets = (
+        values.group_by("category", bucket)
+        .agg(pl.len().alias("count"))
+        .collect(engine="streaming")
+        .sort("category", "bucket", nulls_last=False)
+        .with_columns(
+            (pl.col("count").cum_sum().over("category") - pl.col("count")).alias(
+                "start"
+            ),
+            lower.alias("lower"),
+            upper.alias("upper"),
+        )
+    )
+    # 中央の位置を含むバケットだけを細かく数える
+    start, end = pl.col("start"), pl.col("start") + pl.col("count")
+    middle = buckets.filter(
+        ((start <= pl.col("lower")) & (pl.col("lower") < end))
+        | ((start <= pl.col("upper")) & (pl.col("upper") < end))
+    ).select("category", "bucket", "start", "lower", "upper")
+
+    histogram = (
+        middle.lazy()
+        .join(values.with_columns(bucket), on=["category", "bucket"], nulls_equal=True)
+        .group_by("category", "bucket", "start", "lower", "upper", "value")
+        .agg(pl.len().alias("count"))
+        .collect(engine="streaming")
+        .sort("category", "value", nulls_last=False)
+    )
+    position = pl.col("start") + pl.col("count").cum_sum().over("category", "bucket")
+    return (
+        histogram.with_columns(position.alias("position"))
+        .group_by("category", maintain_order=True)
+        .agg(
+            (
+                (
+                    value.filter(pl.col("position") > pl.col("lower")).first()
+                    + value.filter(pl.col("position") > pl.col("upper")).first()
+                )
+                / 2
+            ).alias("median")
+        )
+        .with_columns(pl.col("category").cast(pl.String))
+    )
+
+
+def group_stats(stats: pl.DataFrame, keep: list[str], other: str) -> pl.DataFrame:
+    """
+    Merge the statistics of the categories outside keep into one other group.
+
+    Args:
+        stats: Output of category_stats
+        keep: Categories kept as they are
+        other: Name of the group the remaining categories are merged into
+
+    Returns:
+        pl.DataFrame: Columns category, count, sum (and sum_sq if present in
+        stats) of the grouped categories
+    """
+    additive = [col for col in ["count", "sum", "sum_sq"] if col in stats.columns]
+    return (
+        stats.with_columns(
+            pl.when(pl.col("category").is_in(keep))
+            .then(pl.col("category"))
+            .otherwise(pl.lit(other))
+            .alias("category")
+        )
+        .group_by("category")
+        .agg(pl.col(additive).sum())
+        .sort("category")
+    )
+
+
+def merge_stats(
+    stats: pl.DataFrame, batch: pl.DataFrame, decay: float = 1.0
+) -> pl.DataFrame:
+    """
+    Add the statistics of a new batch to accumulated statistics.
+
+    The accumulated counts and sums are first multiplied by decay, which gives
+    an exponential time decay when batches are merged in order. Sketched
+    medians (see sketch_stats) are merged through their sketches, whose counts
+    decay the same way, as are exact medians kept with their value counts
+    (category_stats with mergeable_median). A bare exact median cannot be
+    merged and raises a ValueError.
+
+    Args:
+        stats: Accumulated statistics (category_stats output)
+        batch: Statistics of the new batch (only the statistics present in both
+            frames are merged)
+        decay: Weight of the accumulated statistics, in (0, 1]
+
+    Returns:
+        pl.DataFrame: Merged statistics (counts as Float64), sorted by category
+    """
+    if not 0 < decay <= 1:
+        raise ValueError("decay must be in (0, 1].")
+
+    # 両方にある統計だけを合算する
+    shared = [col for col in stats.columns if col in batch.columns]
+    additive = [col for col in ["count", "sum", "sum_sq"] if col in shared]
+    sketched = "sketch" in shared
+    if "median" in shared and not sketched:
+        raise ValueError(
+            "Exact medians cannot be merged without their value counts "
+            "(see category_stats with mergeable_median)."
+        )
+
+    merged = (
+        pl.concat(
+            [
+                stats.select("category", pl.col(additive).cast(pl.Float64) * decay),
+                batch.select("category", pl.col(additive).cast(pl.Float64)),
+            ]
+        )
+        .group_by("category")
+        .agg(pl.col(additive).sum())
+        .sort("category")
+    )
+    if not sketched:
+        return merged
+
+    counts = pl.concat(
+        [
+            _sketch_counts(stats).with_columns(pl.col("count") * decay),
+            _sketch_counts(batch),
+        ]
+    )
+    return _join_category(merged, sketch_stats(counts))
+
+
+def _sketch_counts(stats: pl.DataFrame) -> pl.DataFrame:
+    # スケッチを (category, value, count) の行に展開する
+    return (
+        stats.select("category", "sketch")
+        .explode("sketch")
+        .unnest("sketch")
+        .drop_nulls("value")
+        .with_columns(pl.col("count").cast(pl.Float64))
+    )
+
+
+def sketch_value_expr(value: pl.Expr, relative_accuracy: float) -> pl.Expr:
+    """
+    Round values to the representative of their quantile-sketch bucket.
+
+    The buckets are those of DDSketch: with gamma = (1 + a) / (1 - a), bucket
+    i holds the magnitudes in (gamma^(i-1), gamma^i], and its representative
+    2 gamma^i / (gamma + 1) is within relative error a of all of them. The
+    rounding is monotone, so every quantile of the rounded values is the
+    rounded quantile, within relative error a of the exact one.
+
+    Args:
+        value: Values to round
+        relative_accuracy: Relative accuracy a, in (0, 1)
+
+    Returns:
+        pl.Expr: Rounded values (0 stays 0)
+    """
+    gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    index = (value.abs().log() / math.log(gamma)).ceil()
+    return value.sign() * 2 * pl.lit(gamma).pow(index) / (gamma + 1)
+
+
+def _value_counts_query(
+    df: pl.LazyFrame,
+    column: str,
+    target: str,
+    relative_accuracy: float | None = None,
+) -> pl.LazyFrame:
+    value = pl.col(target).cast(pl.Float64)
+    if relative_accuracy is not None:
+        value = sketch_value_expr(value, relative_accuracy)
+    return (
+        df.filter(pl.col(target).is_not_null())
+        .group_by(pl.col(column).alias("category"), value.alias("value"))
+        .agg(pl.len().alias("count"))
+        .with_columns(pl.col("category").cast(pl.String))
+    )
+
+
+def value_counts(
+    category: pl.Series, target: pl.Series, relative_accuracy: float | None = None
+) -> pl.DataFrame:
+    """
+    Count the rows of every (category, target value) pair.
+
+    Unlike medians, these counts are mergeable (by adding the counts of equal
+    pairs), and the exact median per category follows from them (see
+    median_from_value_counts). Missing targets are ignored, as by the median.
+
+    With a relative accuracy, the values are first rounded by
+    sketch_value_expr, which bounds the number of pairs per category by the
+    number of sketch buckets spanned by the target (about
+    ln(max / min) / (2 a)) instead of its number of distinct values.
+
+    Args:
+        category: Categorical column
+        target: Target values (price)
+        relative_accuracy: Relative accuracy of the rounding (exact if None)
+
+    Returns:
+        pl.DataFrame: Columns category (as string), value and count
+    """
+    return _value_counts_query(
+        pl.DataFrame([category.alias("category"), target.alias("target")]).lazy(),
+        "category",
+        "target",
+        relative_accuracy,
+    ).collect()
+
+
+def sketch_stats(counts: pl.DataFrame) -> pl.DataFrame:
+    """
+    Quantile sketch and median of the target per category.
+
+    The sketch of a category is the list of its (rounded value, count) pairs.
+    Sketches are merged by adding the counts of equal values (see
+    merge_stats), so the sketched median of merged data is the same as when
+    the data is sketched at once.
+
+    Args:
+        counts: value_counts output, with rounded values
+
+    Returns:
+        pl.DataFrame: Columns category, sketch (list of value/count structs, by
+        increasing value) and median
+    """
+    counts = (
+        counts.group_by("category", "value")
+        .agg(pl.col("count").cast(pl.Float64).sum())
+        .sort("category", "value", nulls_last=False)
+    )
+    return _join_category(
+        counts.group_by("category", maintain_order=True).agg(
+            pl.struct("value", "count").alias("sketch")
+        ),
+        median_from_value_counts(counts),
+    )
+
+
+def median_from_value_counts(counts: pl.DataFrame) -> pl.DataFrame:
+    """
+    Exact median of the target per category from value_counts output.
+
+    The counts may be weights (e.g. decayed by merge_stats): the median only
+    depends on their proportions, and equals the usual median for row counts.
+
+    Args:
+        counts: Columns category, value and count (e.g. merged value_counts)
+
+    Returns:
+        pl.DataFrame: Columns category and median, sorted by category
+    """
+    # 累積件数が半分に達する値と半分を超える値の平均（件数が整数なら
+    # 0始まりで (n-1)//2 番目と n//2 番目の値の平均）。減衰した件数の丸め
+    # 誤差で半分ちょうどの判定が変わらないよう相対誤差を許容する
+    half = pl.col("count").sum().over("category") / 2
+    position = pl.col("count").cum_sum().over("category")
+    value = pl.col("value")
+    return (
+        counts.group_by("category", "value")
+        .agg(pl.col("count").sum())
+        .sort("category", "value", nulls_last=False)
+        .with_columns(position.alias("position"), half.alias("half"))
+        .group_by("category", maintain_order=True)
+        .agg(
+            (
+                (
+                    value.filter(
+                        pl.col("position") >= pl.col("half") * (1 - _COUNT_RTOL)
+                    ).first()
+                    + value.filter(
+                        pl.col("position") > pl.col("half") * (1 + _COUNT_RTOL)
+                    ).first()
+                )
+                / 2
+            ).alias("median")
+        )
+    )
+
+
+def stats_to_arrays(stats: pl.DataFrame) -> dict[str, np.ndarray]:
+    """
+    Export statistics as flat numpy arrays (e.g. for np.savez).
+
+    Args:
+        stats: category_stats output
+
+    Returns:
+        dict[str, np.ndarray]: category (missing as ""), category_is_null,
+        one float array per statistic, and the sketch (if any) as the sketch
+        length per category and the concatenated sketch values and counts
+    """
+    arrays = {
+        "category": stats.get_column("category").fill_null("").to_numpy().astype(str),
+        "category_is_null": stats.get_column("category").is_null().to_numpy(),
+    }
+    for col in stats.columns:
+        if col == "sketch":
+            sketch = stats.get_column("sketch")
+            counts = _sketch_counts(stats)
+            arrays["sketch.length"] = sketch.list.len().fill_null(0).to_numpy()
+            arrays["sketch.value"] = counts.get_column("value").to_numpy()
+            arrays["sketch.count"] = counts.get_column("count").to_numpy()
+        elif col != "category":
+            arrays[col] = stats.get_column(col).cast(pl.Float64).to_numpy()
+    return arrays
+
+
+def stats_from_arrays(arrays: dict[str, np.ndarray]) -> pl.DataFrame:
+    """Restore statistics exported by stats_to_arrays."""
+    category = pl.Series("category", arrays["category"], dtype=pl.String)
+    stats = pl.DataFrame(
+        [
+            category.set(pl.Series(arrays["category_is_null"]), None),
+            *[
+                pl.Series(name, values, dtype=pl.Float64)
+                for name, values in arrays.items()
+                if name not in ("category", "category_is_null")
+                and not name.startswith("sketch.")
+            ],
+        ]
+    )
+    if "sketch.length" not in arrays:
+        return stats
+
+    # 連結したスケッチをカテゴリごとのリストに戻す
+    entries = pl.DataFrame(
+        {"value": arrays["sketch.value"], "count": arrays["sketch.count"]}
+    ).select(pl.struct("value", "count").alias("sketch"))
+    ends = np.cumsum(arrays["sketch.length"])
+    starts = ends - arrays["sketch.length"]
+    sketch = pl.Series(
+        "sketch",
+        [
+            entries.to_series().slice(start, end - start)
+            for start, end in zip(starts, ends)
+        ],
+        dtype=pl.List(entries.schema["sketch"]),
+    )
+    return stats.with_columns(sketch)
+
+
+def price_window_expr(price_lower_bound: float, price_upper_bound: float) -> pl.Expr:
+    """Rows whose price lies strictly inside the bounds (outliers excluded)."""
+    return (pl.col("price") < price_upper_bound) & (pl.col("price") > price_lower_bound)
+
+
+class CategoryPriceIndex:
+    """
+    Per-category statistics of a column for any price window.
+
+    The rows are sorted by (category, price) once and the price is reduced to
+    its rank among the distinct prices, so every category's rows inside a
+    price window form one contiguous run. Counts, sums and medians of a window
+    then come from binary searches and prefix sums, without filtering or
+    re-aggregating the training data.
+
+    Args:
+        category: Categorical column of the training data
+        target: Target values (price)
+        price_order: Stable argsort of target, shared between the columns
+    """
+
+    def __init__(
+        self,
+        category: pl.Series,
+        target: pl.Series,
+        price_order: np.ndarray | None = None,
+    ):
+        target = target.cast(pl.Float64).to_numpy()
+        if price_order is None:
+            price_order = np.argsort(target, kind="stable")
+        # 価格が欠損している行は除く（NaN は末尾に並ぶ）
+        price_order = price_order[~np.isnan(target[price_order])]
+
+        if isinstance(category.dtype, (pl.Enum, pl.Categorical)):
+            physical = category.to_physical()
+        else:
+            physical = category.cast(pl.Categorical).to_physical()
+        codes = physical.cast(pl.Int64).fill_null(-1).to_numpy()
+
+        # 価格順の並びをカテゴリコードで安定ソートし (category, price) 順にする
+        order = price_order[np.argsort(codes[price_order], kind="stable")]
+        codes = codes[order]
+        prices = target[order]
+
+        starts = np.flatnonzero(np.diff(codes, prepend=-2))
+        self.categories = category.gather(order[starts]).cast(pl.String)
+        runs = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(codes))))
+
+        self.prices = np.unique(prices)
+        ranks = np.searchsorted(self.prices, prices)
+        # (category, price) の順に単調増加するキー
+        self.keys = runs * len(self.prices) + ranks
+        self.prefix_sums = np.concatenate([[0.0], np.cumsum(prices)])
+
+    def stats(
+        self,
+        price_lower_bound: float,
+        price_upper_bound: float,
+        median: bool = False,
+        median_accuracy: float | None = None,
+    ) -> pl.DataFrame:
+        """
+        Aggregate the target per category over the rows inside the price bounds.
+
+        A sketched median is computed from the exact middle values, which
+        gives the same median as the sketch, but no sketch column.
+
+        Args:
+            price_lower_bound: Exclusive lower bound of the price
+            price_upper_bound: Exclusive upper bound of the price
+            median: Whether to also compute the median target per category
+            median_accuracy: Relative accuracy of a sketched median (exact if
+                None)
+
+        Returns:
+            pl.DataFrame: Same as category_stats on the rows inside the bounds
+        """
+        n_prices = len(self.prices)
+        offsets = np.arange(len(self.categories), dtype=np.int64) * n_prices
+        lower_rank = np.searchsorted(self.prices, price_lower_bound, side="right")
+        upper_rank = np.searchsorted(self.prices, price_upper_bound, side="left")
+        upper_rank = max(upper_rank, lower_rank)
+
+        start = np.searchsorted(self.keys, offsets + lower_rank)
+        end = np.searchsorted(self.keys, offsets + upper_rank)
+        counts = end - start
+        present = counts > 0
+        start, end, counts = start[present], end[present], counts[present]
+
+        columns = {
+            "category": self.categories.filter(pl.Series(present)),
+            "count": pl.Series(counts, dtype=pl.UInt32),
+            "sum": self.prefix_sums[end] - self.prefix_sums[start],
+        }
+        if median:
+            ranks = self.keys % n_prices
+            low = self.prices[ranks[start + (counts - 1) // 2]]
+            high = self.prices[ranks[start + counts // 2]]
+            if median_accuracy is not None:
+                # 丸めは単調なので、丸めた値の中央値は中央の値を丸めたものになる
+                low, high = (
+                    pl.select(sketch_value_expr(pl.lit(pl.Series(x)), median_accuracy))
+                    .to_series()
+                    .to_numpy()
+                    for x in (low, high)
+                )
+            columns["median"] = (low + high) / 2
+
+        return pl.DataFrame(columns).sort("category")
+
+
+class CategoryStatsCache:
+    """
+    Cache of the per-category statistics of one training set.
+
+    The statistics depend only on the training rows kept by the price bounds,
+    not on the target-encoding parameters. Each column is indexed once by a
+    CategoryPriceIndex, and every trial of a hyperparameter search, whatever
+    its price bounds and target-encoding parameters, fits its encoders from
+    binary searches over the index in time proportional to the number of
+    categories.
+
+    Args:
+        train_df: Training data with the categorical columns and price
+    """
+
+    def __init__(self, train_df: pl.DataFrame):
+        self.train_df = train_df
+        self._price_order: np.ndarray | None = None
+        self._indexes: dict[str, CategoryPriceIndex] = {}
+
+    def get(
+        self,
+        column: str,
+        price_lower_bound: float,
+        price_upper_bound: float,
+        median: bool = False,
+        median_accuracy: float | None = None,
+    ) -> pl.DataFrame:
+        """
+        Return category_stats of a column over the rows inside the price bounds.
+
+        Args:
+            column: Categorical column
+            price_lower_bound: Exclusive lower bound of the price
+            price_upper_bound: Exclusive upper bound of the price
+            median: Whether the median target per category is needed
+            median_accuracy: Relative accuracy of a sketched median (exact if
+                None)
+
+        Returns:
+            pl.DataFrame: Output of category_stats
+        """
+        index = self._indexes.get(column)
+        if index is None:
+            price = self.train_df.get_column("price")
+            if self._price_order is None:
+                self._price_order = np.argsort(price.to_numpy(), kind="stable")
+            index = CategoryPriceIndex(
+                self.train_df.get_column(column), price, self._price_order
+            )
+            self._indexes[column] = index
+        return index.stats(
+            price_lower_bound,
+            price_upper_bound,
+            median=median,
+            median_accuracy=median_accuracy,
+        )
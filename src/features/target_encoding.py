@@ -2,6 +2,22 @@ import numpy as np
 import polars as pl
 from sklearn.base import BaseEstimator, TransformerMixin
 
+from src.features.stats import (
+    category_stats,
+    merge_stats,
+    stats_from_arrays,
+    stats_to_arrays,
+)
+
+
+def _to_series(values: np.ndarray | pl.Series | pl.DataFrame) -> pl.Series:
+    """1列のデータを pl.Series に揃える"""
+    if isinstance(values, pl.DataFrame):
+        return values.to_series(0)
+    if isinstance(values, pl.Series):
+        return values
+    return pl.Series(values=np.asarray(values).ravel())
+
 
 class TargetEncoder(BaseEstimator, TransformerMixin):
     def __init__(self, smoothing=1.0, min_samples_leaf=1, noise_level=0.01):
@@ -9,7 +25,16 @@ class TargetEncoder(BaseEstimator, TransformerMixin):
         self.min_samples_leaf = min_samples_leaf
         self.noise_level = noise_level
         self.global_mean = None
-        self.category_encoding_map = {}
+        # 学習済みのエンコーディングテーブル（カテゴリ昇順のキーと値）
+        self.categories_ = np.array([], dtype=object)
+        self.encodings_ = np.array([], dtype=float)
+        # partial_fit で更新するカテゴリ統計（件数と合計）
+        self.stats_: pl.DataFrame | None = None
+
+    @property
+    def category_encoding_map(self) -> dict:
+        """カテゴリ -> エンコード値の辞書"""
+        return dict(zip(self.categories_.tolist(), self.encodings_.tolist()))
 
     def fit(
         self,
@@ -18,61 +43,147 @@ class TargetEncoder(BaseEstimator, TransformerMixin):
     ):
         """
         学習データでカテゴリ統計を計算し、エンコーディングマップを作成
+
+        カテゴリごとの件数と合計は group_by の1パスで集計する
         """
-        if isinstance(X, pl.DataFrame):
-            X = X.to_numpy()
-        if isinstance(X, pl.Series):
-            X: np.ndarray = X.to_numpy()
-        if isinstance(y, pl.Series):
-            y: np.ndarray = y.to_numpy()
-
-        X = X.flatten()
-        self.global_mean = np.mean(y)
-
-        # カテゴリごとのエンコード値を事前計算
-        unique_categories = np.unique(X)
-        for category in unique_categories:
-            mask = X == category
-            category_values = y[mask]
-            category_mean = np.mean(category_values)
-            category_count = len(category_values)
-
-            # 件数が少ない場合は全体平均
-            if category_count < self.min_samples_leaf:
-                encoded_value = self.global_mean
-            else:
-                # Smoothing formula
-                encoded_value = (
-                    category_count * category_mean + self.smoothing * self.global_mean
-                ) / (category_count + self.smoothing)
-
-            self.category_encoding_map[category] = encoded_value
+        return self.fit_stats(category_stats(_to_series(X), _to_series(y)))
+
+    def fit_stats(self, stats: pl.DataFrame) -> "TargetEncoder":
+        """
+        カテゴリごとの件数と合計（category_stats の出力）からエンコーディングを作成
+
+        学習データを走査しないため、カテゴリ数に比例する時間で済む
+        """
+        self.stats_ = stats
+        counts = stats["count"].to_numpy()
+        sums = stats["sum"].to_numpy()
+        self.global_mean = sums.sum() / counts.sum()
+
+        # 欠損値はテーブルに含めず、全体平均でエンコードする
+        known = stats["category"].is_not_null().to_numpy()
+        counts, sums = counts[known], sums[known]
+
+        # 件数が少ない場合は全体平均、それ以外は smoothing を適用
+        encoded_values = np.where(
+            counts < self.min_samples_leaf,
+            self.global_mean,
+            (sums + self.smoothing * self.global_mean) / (counts + self.smoothing),
+        )
+
+        self.categories_ = stats["category"].to_numpy()[known]
+        self.encodings_ = encoded_values
 
         return self
 
+    def partial_fit(
+        self,
+        X: np.ndarray | pl.Series,
+        y: np.ndarray | pl.Series,
+        decay: float = 1.0,
+    ) -> "TargetEncoder":
+        """
+        新しいバッチのカテゴリ統計を蓄積済みの統計に加えてエンコーディングを更新
+
+        蓄積済みの件数と合計は decay 倍してから加える（指数的な時間減衰）。
+        エンコーディングの再計算はカテゴリ数に比例する時間で済む。
+        統計が未学習の場合は fit と同じ
+
+        Args:
+            X: 新しいバッチのカテゴリ
+            y: 新しいバッチの目的変数
+            decay: 蓄積済みの統計の重み（0より大きく1以下、1なら減衰なし）
+        """
+        batch = category_stats(_to_series(X), _to_series(y))
+        if self.stats_ is None:
+            return self.fit_stats(batch)
+        return self.fit_stats(merge_stats(self.stats_, batch, decay))
+
     def transform(self, X: np.ndarray | pl.Series) -> np.ndarray:
         """
         カテゴリをtarget encodingで変換（未知カテゴリにも対応）
         """
-        if isinstance(X, pl.Series) or isinstance(X, pl.DataFrame):
-            X = X.to_numpy()
-        X = X.flatten()
-
-        # ベクトル化された変換
-        result = np.array(
-            [
-                self.category_encoding_map.get(category, self.global_mean)
-                for category in X
-            ],
-            dtype=float,
+        X = _to_series(X)
+        return pl.select(self.transform_expr(pl.lit(X), len(X))).to_series().to_numpy()
+
+    def transform_expr(
+        self,
+        expr: pl.Expr,
+        n_rows: int,
+        add_noise: bool = True,
+        rng: np.random.Generator | None = None,
+    ) -> pl.Expr:
+        """
+        target encodingを行う polars 式を返す
+
+        Args:
+            expr: カテゴリ列の式
+            n_rows: 式を評価するフレームの行数（ノイズの生成に使用）
+            add_noise: ノイズを加えるか（推論時は False）
+            rng: ノイズの乱数生成器（None の場合は numpy のグローバル乱数）
+        """
+        # テーブルとの join で変換し、未知カテゴリは全体平均にする
+        result = expr.replace_strict(
+            pl.Series(self.categories_, dtype=pl.String),
+            self.encodings_,
+            default=self.global_mean,
+            return_dtype=pl.Float64,
         )
 
+        return self.add_noise_expr(result, n_rows, add_noise, rng)
+
+    def add_noise_expr(
+        self,
+        expr: pl.Expr,
+        n_rows: int,
+        add_noise: bool = True,
+        rng: np.random.Generator | None = None,
+    ) -> pl.Expr:
+        """
+        エンコード済みの式に正規ノイズを加える
+
+        Args:
+            expr: エンコード済みの式
+            n_rows: 式を評価するフレームの行数
+            add_noise: ノイズを加えるか（推論時は False）
+            rng: ノイズの乱数生成器（None の場合は numpy のグローバル乱数）
+        """
         # 軽微なノイズを追加してoverfittingを防ぐ
-        if self.noise_level > 0:
-            noise = np.random.normal(0, self.noise_level, size=len(result))
-            result += noise
+        if add_noise and self.noise_level > 0:
+            normal = rng.normal if rng is not None else np.random.normal
+            noise = normal(0, self.noise_level, size=n_rows)
+            expr = expr + pl.lit(pl.Series(noise))
+
+        return expr
+
+    def get_fitted_state(self) -> dict[str, np.ndarray]:
+        """
+        学習済みのテーブルを numpy 配列として出力
+        """
+        state = {
+            "categories_": np.asarray(self.categories_, dtype=str),
+            "encodings_": self.encodings_,
+            "global_mean": np.asarray(self.global_mean),
+        }
+        if self.stats_ is not None:
+            for key, value in stats_to_arrays(self.stats_).items():
+                state[f"stats.{key}"] = value
+        return state
 
-        return result
+    def set_fitted_state(self, state: dict[str, np.ndarray]) -> "TargetEncoder":
+        """
+        get_fitted_state で出力したテーブルを復元
+        """
+        self.categories_ = state["categories_"]
+        self.encodings_ = state["encodings_"]
+        self.global_mean = float(state["global_mean"])
+
+        stats_state = {
+            key.removeprefix("stats."): value
+            for key, value in state.items()
+            if key.startswith("stats.")
+        }
+        self.stats_ = stats_from_arrays(stats_state) if stats_state else None
+        return self
 
     def fit_transform(self, X, y):
         """
@@ -1,14 +1,18 @@
 from typing import Union
 
+import numpy as np
 import polars as pl
-from sklearn.preprocessing import LabelEncoder
 
 from src.config.preprocess import TargetEncoderConfig
 from src.features.base_encoder import BaseEncoder
-from src.features.target_encoding import TargetEncoder
+from src.features.label_encoding import LabelEncoder
+from src.features.stats import group_stats
 
 
 class TypeEncoder(BaseEncoder):
+    column = "type"
+    _fitted_attributes = ("major_types_",)
+
     def __init__(
         self,
         use_grouping: bool = True,
@@ -20,62 +24,48 @@ class TypeEncoder(BaseEncoder):
         self.use_grouping = use_grouping
         self.use_label_encoding = use_label_encoding
 
-    def fit(self, X: pl.DataFrame, y: pl.DataFrame) -> "TypeEncoder":
-        combined_df = pl.concat([X, y], how="horizontal")
+    @property
+    def type_expr(self) -> pl.Expr:
+        return (
+            pl.when(pl.col("type").is_in(self.major_types_))
+            .then(pl.col("type"))
+            .otherwise(pl.lit("other_types"))
+            .alias("type")
+        )
+
+    def _fit_from_stats(self, stats: pl.DataFrame) -> "TypeEncoder":
         if self.use_grouping:
-            major_types = (
-                combined_df.group_by("type")
-                .agg(pl.len().alias("count"))
-                .filter(pl.col("count") >= 500)
-                .select("type")
-                .to_series()
-                .to_list()
-            )
-            self.type_expr = (
-                pl.when(pl.col("type").is_in(major_types))
-                .then(pl.col("type"))
-                .otherwise(pl.lit("other_types"))
-                .alias("type")
+            self.major_types_ = (
+                stats.filter(pl.col("count") >= 500).get_column("category").to_list()
             )
-            X = X.with_columns(self.type_expr)
+            stats = group_stats(stats, self.major_types_, "other_types")
 
         if self.use_label_encoding:
-            self.label_encoder = LabelEncoder()
-            self.label_encoder.fit(X.select("type").to_numpy().ravel())
+            self.label_encoder = LabelEncoder().fit_stats(stats)
 
         if self.use_target_encoding:
-            self.target_encoder = TargetEncoder(
-                smoothing=self.target_encoder_config.smoothing,
-                min_samples_leaf=self.target_encoder_config.min_samples_leaf,
-                noise_level=self.target_encoder_config.noise_level,
-            )
-            self.target_encoder.fit(X.to_numpy(), y.to_numpy())
+            self.target_encoder = self._make_target_encoder().fit_stats(stats)
         return self
 
-    def transform(self, X: pl.DataFrame) -> pl.DataFrame:
-        result = X.clone()
-        if self.use_grouping:
-            result = result.with_columns(self.type_expr)
+    def transform_exprs(
+        self,
+        n_rows: int,
+        add_noise: bool = True,
+        rng: np.random.Generator | None = None,
+    ) -> list[pl.Expr]:
+        exprs = []
+
+        type = self.type_expr if self.use_grouping else pl.col("type")
 
         if self.use_label_encoding:
-            result = result.with_columns(
-                pl.Series(
-                    name="type_label",
-                    values=self.label_encoder.transform(
-                        result.select("type").to_numpy().ravel()
-                    ),
-                )
-            )
+            exprs.append(self.label_encoder.transform_expr(type).alias("type_label"))
 
         # ターゲットエンコーディング
         if self.use_target_encoding:
-            result = result.with_columns(
-                pl.Series(
-                    name="type_te",
-                    values=self.target_encoder.transform(
-                        result.select("type").to_numpy()
-                    ),
+            exprs.append(
+                self.target_encoder.transform_expr(type, n_rows, add_noise, rng).alias(
+                    "type_te"
                 )
             )
 
-        return result.drop("type")
+        return exprs
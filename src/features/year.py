@@ -1,9 +1,13 @@
+import numpy as np
 import polars as pl
 
 from src.features.base_encoder import BaseEncoder
 
 
 class YearEncoder(BaseEncoder):
+    column = "year"
+    requires_stats = False
+
     def __init__(self, use_1987_flag: bool = True, use_1975_flag: bool = True):
         # YearEncoder doesn't use target encoding, so pass False
         super().__init__(use_target_encoding=False, target_encoder_config=None)
@@ -27,11 +31,19 @@ class YearEncoder(BaseEncoder):
     def fit(self, X: pl.DataFrame, y: pl.DataFrame) -> "YearEncoder":
         return self
 
-    def transform(self, X: pl.DataFrame) -> pl.DataFrame:
-        result = X.clone()
+    def _fit_from_stats(self, stats: pl.DataFrame) -> "YearEncoder":
+        return self
+
+    def transform_exprs(
+        self,
+        n_rows: int,
+        add_noise: bool = True,
+        rng: np.random.Generator | None = None,
+    ) -> list[pl.Expr]:
+        exprs = [pl.col("year")]
 
         if self.use_1987_flag:
-            result = result.with_columns(self.flag_1987_expr)
+            exprs.append(self.flag_1987_expr)
         if self.use_1975_flag:
-            result = result.with_columns(self.flag_1975_expr)
-        return result
+            exprs.append(self.flag_1975_expr)
+        return exprs
@@ -0,0 +1,383 @@
+"""
+Stage-memoized pipeline shared between models.
+
+A Pipeline is a DAG of named stages. Each stage is a function called with the
+results of its input stages (positionally) and its parameters (as keyword
+arguments). Its result is memoized under a key derived from the function, the
+parameters and the keys of its inputs, so two stages doing the same work on
+the same inputs, e.g. the preprocessing of two models that use the same
+PreprocessorConfig, run once and share their result, also across run calls.
+
+Stages whose inputs are ready run concurrently on a thread pool (polars and
+LightGBM release the GIL), so independent branches such as the trainings of
+two models overlap.
+
+The module also provides the stages of the usual flow: load, filter, fit
+encoders, transform, train model and predict, and the stages of the
+regression / anomaly detection ensemble: remove outliers, annotate anomaly and
+ensemble splits. Any other named function can be added as a stage as well.
+
+Example:
+    pipeline = Pipeline(n_jobs=2)
+    pipeline.add("data", load_stage, columns=FEATURE_COLUMNS)
+    pipeline.add("filtered", filter_stage, "data", config=config)
+    pipeline.add(
+        "encoders", fit_encoders_stage, "filtered", config=config, random_state=0
+    )
+    pipeline.add("features", transform_stage, "encoders", "filtered")
+    features = pipeline.run("features")["features"]
+"""
+
+import hashlib
+import json
+import os
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+import lightgbm as lgb
+import numpy as np
+import polars as pl
+from pydantic import BaseModel
+
+from src.config.preprocess import PreprocessorConfig
+from src.data.cache import load_splits
+from src.features.matrix import FeatureMatrix
+from src.features.preprocess import Preprocessor
+from src.features.preprocess_cache import frame_fingerprint
+from src.features.stats import price_window_expr
+
+Splits = tuple[pl.DataFrame, pl.DataFrame, pl.DataFrame]
+
+
+def fingerprint(value: Any) -> str:
+    """
+    Stable hash of a stage parameter.
+
+    Supports None, bool, int, float, str, Path, pydantic models (e.g.
+    PreprocessorConfig), polars frames, numpy arrays, and lists, tuples and
+    dicts of those.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if value is None or isinstance(value, (bool, int, float, str, Path)):
+        digest.update(repr(value).encode())
+    elif isinstance(value, BaseModel):
+        dumped = json.dumps(value.model_dump(mode="json"), sort_keys=True)
+        digest.update(f"{type(value).__qualname__}:{dumped}".encode())
+    elif isinstance(value, pl.DataFrame):
+        digest.update(frame_fingerprint(value).encode())
+    elif isinstance(value, np.ndarray):
+        digest.update(repr((value.dtype.str, value.shape)).encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, (list, tuple)):
+        digest.update(type(value).__name__.encode())
+        for item in value:
+            digest.update(fingerprint(item).encode())
+    elif isinstance(value, dict):
+        for key in sorted(value, key=repr):
+            digest.update(fingerprint(key).encode())
+            digest.update(fingerprint(value[key]).encode())
+    else:
+        raise TypeError(f"Cannot fingerprint a stage parameter of type {type(value)}.")
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One node of a Pipeline.
+
+    Args:
+        name: Name of the stage
+        fn: Function computing the result
+        inputs: Names of the stages whose results are passed to fn, in order
+        params: Keyword arguments of fn
+    """
+
+    name: str
+    fn: Callable[..., Any]
+    inputs: tuple[str, ...] = ()
+    params: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class StageRun:
+    """Computation of one stage by Pipeline.run (memoized stages are not run)."""
+
+    name: str
+    key: str
+    seconds: float
+
+
+class Pipeline:
+    """
+    DAG of stages with memoized results.
+
+    Args:
+        n_jobs: Number of stages run concurrently (-1 for one per CPU)
+    """
+
+    def __init__(self, n_jobs: int = 1):
+        self.n_jobs = (os.cpu_count() or 1) if n_jobs == -1 else n_jobs
+        if self.n_jobs < 1:
+            raise ValueError("n_jobs must be a positive integer or -1.")
+
+        self.stages: dict[str, Stage] = {}
+        # Computed stages, in completion order
+        self.history: list[StageRun] = []
+        self._keys: dict[str, str] = {}
+        self._results: dict[str, Any] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], *inputs: str, **params) -> str:
+        """
+        Add a stage.
+
+        Args:
+            name: Name of the stage, unique in the pipeline
+            fn: Named function (not a lambda) computing the result from the
+                results of inputs and params
+            *inputs: Names of stages added before, passed to fn in order
+            **params: Keyword arguments of fn, part of the memoization key
+
+        Returns:
+            str: name, to be used as an input of later stages
+        """
+        if name in self.stages:
+            raise ValueError(f"Stage {name!r} already exists.")
+        missing = [input_name for input_name in inputs if input_name not in self.stages]
+        if missing:
+            raise ValueError(f"Unknown input stages of {name!r}: {missing}.")
+        if fn.__name__ == "<lambda>":
+            raise ValueError("Stage functions must be named functions.")
+
+        # Derived from the keys of the inputs, so that the same work on the same
+        # inputs gets the same key whatever the stage names
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{fn.__module__}.{fn.__qualname__}".encode())
+        digest.update(fingerprint(params).encode())
+        for input_name in inputs:
+            digest.update(self._keys[input_name].encode())
+
+        self.stages[name] = Stage(name, fn, tuple(inputs), dict(params))
+        self._keys[name] = digest.hexdigest()
+        return name
+
+    def key(self, name: str) -> str:
+        """Memoization key of a stage."""
+        return self._keys[name]
+
+    def run(self, *targets: str) -> dict[str, Any]:
+        """
+        Compute the target stages and the stages they depend on.
+
+        Stages whose result is already memoized (from this or an earlier run,
+        or from another stage with the same key) are not run again.
+
+        Args:
+            *targets: Names of the stages to compute
+
+        Returns:
+            dict[str, Any]: Result of every target stage
+        """
+        # Stages to compute, inputs first, each key once
+        order: list[str] = []
+        pending_keys: set[str] = set()
+
+        def visit(name: str) -> None:
+            key = self._keys[name]
+            if key in self._results or key in pending_keys:
+                return
+            for input_name in self.stages[name].inputs:
+                visit(input_name)
+            pending_keys.add(key)
+            order.append(name)
+
+        for target in targets:
+            visit(target)
+
+        if self.n_jobs == 1:
+            for name in order:
+                self._store(name, *self._compute(name))
+        else:
+            self._run_concurrently(order)
+
+        return {target: self._results[self._keys[target]] for target in targets}
+
+    def _run_concurrently(self, order: list[str]) -> None:
+        # Submit every stage as soon as the results of its inputs are memoized
+        waiting = list(order)
+        running: dict[Future, str] = {}
+        with ThreadPoolExecutor(max_workers=self.n_jobs) as executor:
+            while waiting or running:
+                for name in list(waiting):
+                    if all(
+                        self._keys[input_name] in self._results
+                        for input_name in self.stages[name].inputs
+                    ):
+                        waiting.remove(name)
+                        running[executor.submit(self._compute, name)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    self._store(name, *future.result())
+
+    def _compute(self, name: str) -> tuple[Any, float]:
+        stage = self.stages[name]
+        args = [self._results[self._keys[input_name]] for input_name in stage.inputs]
+        start = time.perf_counter()
+        result = stage.fn(*args, **stage.params)
+        return result, time.perf_counter() - start
+
+    def _store(self, name: str, result: Any, seconds: float) -> None:
+        key = self._keys[name]
+        self._results[key] = result
+        self.history.append(StageRun(name, key, seconds))
+
+
+def load_stage(columns: list[str] | None = None) -> Splits:
+    """Load the train, validation and test splits (see load_splits)."""
+    return load_splits(columns=columns)
+
+
+def filter_stage(splits: Splits, config: PreprocessorConfig) -> Splits:
+    """
+    Exclude price outliers as Preprocessor.run does.
+
+    The training split is always filtered, the validation split only if
+    config.remove_outliers_val, and the test split never.
+    """
+    train_df, val_df, test_df = splits
+    window = price_window_expr(config.price_lower_bound, config.price_upper_bound)
+    train_df = train_df.filter(window)
+    if config.remove_outliers_val:
+        val_df = val_df.filter(window)
+    return train_df, val_df, test_df
+
+
+def fit_encoders_stage(
+    splits: Splits, config: PreprocessorConfig, random_state: int
+) -> Preprocessor:
+    """
+    Fit a Preprocessor on the (filtered) training split.
+
+    random_state seeds the target-encoding noise drawn by transform_stage. It
+    is required: a memoized unseeded stage would hand one noise draw to every
+    stage sharing its key, instead of a fresh draw each.
+    """
+    return Preprocessor(**config.to_dict(), random_state=random_state).fit(splits[0])
+
+
+def transform_stage(preprocessor: Preprocessor, splits: Splits) -> Splits:
+    """
+    Transform the three (filtered) splits with a fitted Preprocessor.
+
+    Together with filter_stage and fit_encoders_stage, gives the same frames
+    as Preprocessor.run (the same noise for the same random_state).
+    """
+    train_df, val_df, test_df = (
+        preprocessor.transform(df, split=split)
+        for df, split in zip(splits, ("train", "val", "test"))
+    )
+    return train_df, val_df, test_df
+
+
+def remove_outliers(splits: Splits, lower_bound: float, upper_bound: float) -> Splits:
+    """
+    Keep the training and validation rows priced within [lower_bound, upper_bound].
+
+    The test split is left untouched so that it is scored on every listing.
+    """
+    train_df, val_df, test_df = splits
+    window = pl.col("price").is_between(lower_bound, upper_bound)
+    return train_df.filter(window), val_df.filter(window), test_df
+
+
+def annotate_anomaly(splits: Splits, threshold: float = 40_000) -> Splits:
+    """
+    Replace the price by the is_anomaly label (price above threshold).
+
+    Args:
+        splits: Preprocessed train, validation and test splits
+        threshold: Price above which a listing is an anomaly
+
+    Returns:
+        Splits: The splits with an is_anomaly column instead of price
+    """
+    anomaly_expr = (pl.col("price") > threshold).alias("is_anomaly")
+    train_df, val_df, test_df = (
+        df.with_columns(anomaly_expr).drop("price") for df in splits
+    )
+    return train_df, val_df, test_df
+
+
+def train_model_stage(
+    splits: Splits, label: str, params: dict, num_boost_round: int = 100
+) -> lgb.Booster:
+    """
+    Train a LightGBM model on the training split, validated on the validation one.
+
+    Args:
+        splits: Preprocessed train, validation and test splits
+        label: Label column
+        params: LightGBM parameters
+        num_boost_round: Number of boosting rounds
+
+    Returns:
+        lgb.Booster: Trained model
+    """
+    train_df, val_df, _ = splits
+    train_set = FeatureMatrix.from_frame(train_df, label=label).to_dataset()
+    val_set = FeatureMatrix.from_frame(val_df, label=label).to_dataset(
+        reference=train_set
+    )
+    return lgb.train(
+        params, train_set, num_boost_round=num_boost_round, valid_sets=[val_set]
+    )
+
+
+def predict_stage(
+    model: lgb.Booster, splits: Splits
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Predict the three preprocessed splits with a trained model."""
+    train_pred, val_pred, test_pred = (
+        FeatureMatrix.from_frame(df).predict(model) for df in splits
+    )
+    return train_pred, val_pred, test_pred
+
+
+def ensemble_splits(
+    price_predictions: tuple[np.ndarray, ...],
+    anomaly_predictions: tuple[np.ndarray, ...],
+    constant_prediction: float,
+    alpha: float = 0.9,
+) -> tuple[np.ndarray, ...]:
+    """Apply ensemble_predictions to each of the train, validation and test splits."""
+    return tuple(
+        ensemble_predictions(price, anomaly, constant_prediction, alpha)
+        for price, anomaly in zip(price_predictions, anomaly_predictions)
+    )
+
+
+def ensemble_predictions(
+    price_predictions: np.ndarray,
+    anomaly_predictions: np.ndarray,
+    constant_prediction: float,
+    alpha: float = 0.9,
+) -> np.ndarray:
+    """
+    Blend price predictions with a constant, weighted by the anomaly predictions.
+
+    Args:
+        price_predictions: Predictions of the regression model
+        anomaly_predictions: Predictions of the anomaly detection model
+        constant_prediction: Constant the predictions are blended with
+        alpha: Exponent applied to the anomaly predictions (0 <= alpha <= 1)
+
+    Returns:
+        np.ndarray: anomaly**alpha * price + (1 - anomaly**alpha) * constant
+    """
+    weight = anomaly_predictions**alpha
+    return weight * price_predictions + (1 - weight) * constant_prediction
@@ -0,0 +1,161 @@
+"""
+Streaming batch scoring of listing files.
+
+Listings are read in fixed-size batches, transformed by a fitted
+Preprocessor, scored by a LightGBM booster and appended to a Parquet file,
+so peak memory depends on the batch size rather than on the file size.
+"""
+
+from collections.abc import Iterator
+from pathlib import Path
+
+import lightgbm as lgb
+import polars as pl
+import pyarrow.parquet as pq
+
+from src.data.cache import SCHEMA
+from src.features.matrix import FeatureMatrix
+from src.features.preprocess import Preprocessor
+
+
+def iter_batches(
+    path: str | Path, batch_size: int, columns: list[str] | None = None
+) -> Iterator[pl.DataFrame]:
+    """
+    Read a CSV or Parquet file in batches of at most batch_size rows.
+
+    Args:
+        path: Input file (.csv or .parquet)
+        batch_size: Maximum number of rows per batch
+        columns: Columns to read (all columns if None)
+
+    Yields:
+        pl.DataFrame: Consecutive batches of the file
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        # Slices are pushed down to the reader, which skips row groups outside
+        # the requested range instead of loading the whole file
+        lf = pl.scan_parquet(path)
+        if columns is not None:
+            lf = lf.select(columns)
+        n_rows = pl.scan_parquet(path).select(pl.len()).collect().item()
+        for offset in range(0, n_rows, batch_size):
+            yield lf.slice(offset, batch_size).collect()
+    elif path.suffix == ".csv":
+        if path.stat().st_size == 0:
+            # polars cannot open a CSV file without even a header
+            return
+        # A sliced scan_csv has to re-parse the file up to the offset, so CSV
+        # files are read with the batched reader instead
+        reader = pl.read_csv_batched(path, columns=columns, batch_size=batch_size)
+        while batches := reader.next_batches(1):
+            for offset in range(0, batches[0].height, batch_size):
+                yield batches[0].slice(offset, batch_size)
+    else:
+        raise ValueError(f"Unsupported file type: {path.suffix}")
+
+
+def score_file(
+    input_path: str | Path,
+    output_path: str | Path,
+    preprocessor: Preprocessor,
+    booster: lgb.Booster,
+    batch_size: int = 100_000,
+    id_column: str | None = "id",
+) -> int:
+    """
+    Score a listing file batch by batch and write the predictions to Parquet.
+
+    Args:
+        input_path: Listings to score (.csv or .parquet)
+        output_path: Parquet file to write the predictions to
+        preprocessor: Fitted preprocessor
+        booster: Trained LightGBM booster
+        batch_size: Number of rows scored at once
+        id_column: Column copied to the output next to the prediction, if present
+
+    Returns:
+        int: Number of scored rows
+    """
+    feature_names = booster.feature_name()
+    schema = output_schema(input_path, id_column)
+    n_scored = 0
+    writer = None
+    try:
+        for batch in iter_batches(input_path, batch_size):
+            features = preprocessor.transform(batch, add_noise=False)
+            prediction = FeatureMatrix.from_frame(
+                features.select(feature_names)
+            ).predict(booster)
+
+            result = pl.DataFrame({"prediction": prediction})
+            if id_column in schema:
+                result = result.insert_column(0, batch.get_column(id_column))
+
+            table = result.cast(schema).to_arrow()
+            if writer is None:
+                writer = pq.ParquetWriter(output_path, table.schema)
+            writer.write_table(table)
+            n_scored += batch.height
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is None:
+        # Empty input: still write the output file, with the same schema
+        pl.DataFrame(schema=schema).write_parquet(output_path)
+
+    return n_scored
+
+
+def output_schema(input_path: str | Path, id_column: str | None = "id") -> pl.Schema:
+    """
+    Schema of the predictions written by score_file.
+
+    The id column (if present in the input) is typed as in the listing SCHEMA,
+    so the output schema does not depend on what a CSV reader infers (e.g.
+    String for a file without data rows), followed by the Float64 prediction.
+
+    Args:
+        input_path: Listings to score (.csv or .parquet)
+        id_column: Column copied to the output next to the prediction
+
+    Returns:
+        pl.Schema: Schema of the output file
+    """
+    path = Path(input_path)
+    if path.suffix == ".parquet":
+        columns = pl.scan_parquet(path).collect_schema()
+    elif path.stat().st_size == 0:
+        columns = pl.Schema()
+    else:
+        columns = pl.scan_csv(path).collect_schema()
+
+    schema = {"prediction": pl.Float64}
+    if id_column is not None and id_column in columns:
+        schema = {id_column: SCHEMA.get(id_column, columns[id_column]), **schema}
+    return pl.Schema(schema)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Score a listing file in batches.")
+    parser.add_argument("input_path", help="Listings to score (.csv or .parquet)")
+    parser.add_argument("output_path", help="Parquet file for the predictions")
+    parser.add_argument(
+        "--preprocessor", required=True, help="Directory saved by Preprocessor.save"
+    )
+    parser.add_argument("--model", required=True, help="LightGBM model file")
+    parser.add_argument("--batch-size", type=int, default=100_000)
+    args = parser.parse_args()
+
+    n_scored = score_file(
+        args.input_path,
+        args.output_path,
+        Preprocessor.load(args.preprocessor),
+        lgb.Booster(model_file=args.model),
+        batch_size=args.batch_size,
+    )
+    print(f"Scored {n_scored:,} rows -> {args.output_path}")
@@ -0,0 +1,119 @@
+"""
+Low-latency scoring of a single listing.
+
+RecordScorer precompiles a fitted Preprocessor into plain dict lookups, so a
+listing given as a dict is turned into the feature vector without building
+any DataFrame, and then scored by the LightGBM booster.
+"""
+
+from collections.abc import Callable
+from typing import Any
+
+import lightgbm as lgb
+import numpy as np
+import polars as pl
+
+from src.features.base_encoder import BaseEncoder
+from src.features.preprocess import Preprocessor
+
+# Passthrough numerical columns of the preprocessed frame
+PASSTHROUGH_COLUMNS = ["odometer"]
+
+# Maximum number of memoized outputs for values outside the vocabulary
+MAX_UNKNOWN_VALUES = 1024
+
+
+def _compile_encoder(
+    col: str, encoder: BaseEncoder
+) -> tuple[list[str], Callable[[Any], tuple]]:
+    """
+    Compile an encoder into a function from one raw value to its output values.
+
+    The outputs of every known value are computed once with the encoder's own
+    expressions, so the compiled function matches Preprocessor.transform.
+    Unknown values are evaluated on a one-row frame and memoized.
+    """
+
+    vocabulary = encoder.record_vocabulary()
+    dtype = pl.Series(vocabulary).dtype if vocabulary else None
+
+    def evaluate(values: list) -> pl.DataFrame:
+        frame = pl.DataFrame({col: pl.Series(values, dtype=dtype)})
+        return frame.select(encoder.transform_exprs(len(values), add_noise=False))
+
+    def to_row(row: tuple) -> tuple:
+        return tuple(np.nan if value is None else value for value in row)
+
+    table = evaluate(vocabulary)
+    lookup = dict(zip(vocabulary, map(to_row, table.rows())))
+    unknown: dict[Any, tuple] = {}
+
+    def encode(value: Any) -> tuple:
+        row = lookup.get(value)
+        if row is None:
+            row = unknown.get(value)
+            if row is None:
+                row = to_row(evaluate([value]).row(0))
+                if len(unknown) < MAX_UNKNOWN_VALUES:
+                    unknown[value] = row
+        return row
+
+    return table.columns, encode
+
+
+class RecordScorer:
+    """
+    Scorer for one listing at a time.
+
+    Args:
+        preprocessor: Fitted preprocessor
+        booster: Trained LightGBM booster
+    """
+
+    def __init__(self, preprocessor: Preprocessor, booster: lgb.Booster):
+        self.booster = booster
+        self.feature_names = booster.feature_name()
+
+        output_names = list(PASSTHROUGH_COLUMNS)
+        self._columns = []
+        self._encoders = []
+        for col, encoder in preprocessor.encoders.items():
+            names, encode = _compile_encoder(col, encoder)
+            output_names.extend(names)
+            self._columns.append(col)
+            self._encoders.append(encode)
+
+        missing = set(self.feature_names) - set(output_names)
+        if missing:
+            raise ValueError(f"Features missing from the preprocessor: {missing}")
+        # Position of each booster feature in the concatenated encoder outputs
+        self._order = [output_names.index(name) for name in self.feature_names]
+
+    def features(self, record: dict) -> list[float]:
+        """
+        Build the feature vector of a listing in the booster's column order.
+
+        Args:
+            record: Raw listing (column name -> value)
+
+        Returns:
+            list[float]: Feature values
+        """
+        values = [record.get(col) for col in PASSTHROUGH_COLUMNS]
+        for col, encode in zip(self._columns, self._encoders):
+            values.extend(encode(record.get(col)))
+        return [values[i] for i in self._order]
+
+    def predict(self, record: dict) -> float:
+        """
+        Score a listing.
+
+        Args:
+            record: Raw listing (column name -> value)
+
+        Returns:
+            float: Model prediction
+        """
+        # Same float32 precision as the FeatureMatrix the booster is trained on
+        features = np.array([self.features(record)], dtype=np.float32)
+        return float(self.booster.predict(features)[0])
@@ -15,6 +15,7 @@ from src.config.preprocess import (
     TransmissionEncoderConfig,
     TypeEncoderConfig,
 )
+from src.features.preprocess_cache import config_fingerprint
 
 
 def suggest_preprocessor_config(
@@ -54,6 +55,15 @@ def suggest_preprocessor_config(
     )
 
 
+def preprocessor_seed(config: PreprocessorConfig) -> int:
+    """
+    前処理パラメータから決まるターゲットエンコーディングのノイズのシード
+
+    前処理パラメータが同じトライアルは同じ特徴量になり、Datasetキャッシュが効く
+    """
+    return int(config_fingerprint(config)[:8], 16)
+
+
 def create_condition_config(target_encoder_config: TargetEncoderConfig):
     """ConditionEncoderConfigをOptunaトライアルから生成"""
     return ConditionEncoderConfig(target_encoder_config=target_encoder_config)
@@ -0,0 +1,106 @@
+"""
+Early stopping and pruning of the LightGBM training inside Optuna trials.
+
+The number of boosting rounds is not searched: every trial trains for at most
+NUM_BOOST_ROUND rounds, stops once the validation metric has not improved for
+EARLY_STOPPING_ROUNDS rounds, and reports the validation metric to the pruner
+every REPORT_INTERVAL rounds so that hopeless trials stop even earlier. The
+effective number of rounds is stored in the "best_iteration" user attribute.
+"""
+
+from typing import Any, Callable, Dict
+
+import lightgbm as lgb
+import optuna
+
+# Upper bound of the boosting rounds of a trial
+NUM_BOOST_ROUND = 1000
+
+# Rounds without improvement of the validation metric before stopping
+EARLY_STOPPING_ROUNDS = 50
+
+# Interval (in boosting rounds) of the values reported to the pruner
+REPORT_INTERVAL = 10
+
+VALID_NAME = "valid"
+
+
+def create_pruner() -> optuna.pruners.BasePruner:
+    """Pruner of the tuning studies."""
+    return optuna.pruners.MedianPruner(n_startup_trials=5, n_warmup_steps=50)
+
+
+def pruning_callback(
+    trial: optuna.Trial,
+    metric: str,
+    valid_name: str = VALID_NAME,
+    interval: int = REPORT_INTERVAL,
+) -> Callable[[lgb.callback.CallbackEnv], None]:
+    """
+    LightGBM callback reporting the validation metric to an Optuna trial.
+
+    Args:
+        trial: Optuna trial object
+        metric: Name of the LightGBM metric to report (e.g. "rmse", "auc")
+        valid_name: Name of the validation set in lgb.train
+        interval: Report every interval boosting rounds
+
+    Returns:
+        Callable: Callback to pass to lgb.train
+
+    Raises:
+        optuna.TrialPruned: When the pruner stops the trial
+    """
+
+    def _callback(env: lgb.callback.CallbackEnv) -> None:
+        iteration = env.iteration + 1
+        if iteration % interval != 0:
+            return
+
+        for data_name, eval_name, value, *_ in env.evaluation_result_list:
+            if data_name == valid_name and eval_name == metric:
+                break
+        else:
+            raise ValueError(f"Metric '{metric}' of '{valid_name}' is not evaluated.")
+
+        trial.report(value, step=iteration)
+        if trial.should_prune():
+            trial.set_user_attr("pruned_iteration", iteration)
+            raise optuna.TrialPruned(f"Trial was pruned at iteration {iteration}.")
+
+    return _callback
+
+
+def train_with_pruning(
+    trial: optuna.Trial,
+    params: Dict[str, Any],
+    train_set: lgb.Dataset,
+    valid_set: lgb.Dataset,
+    metric: str,
+) -> lgb.Booster:
+    """
+    Train LightGBM with early stopping and pruning on the validation set.
+
+    Args:
+        trial: Optuna trial object
+        params: LightGBM parameters (without the number of rounds)
+        train_set: Training data
+        valid_set: Validation data, used for early stopping and pruning
+        metric: Name of the LightGBM metric to monitor
+
+    Returns:
+        lgb.Booster: Model whose best_iteration is the effective number of rounds
+    """
+    model = lgb.train(
+        params,
+        train_set,
+        num_boost_round=NUM_BOOST_ROUND,
+        valid_sets=[valid_set],
+        valid_names=[VALID_NAME],
+        callbacks=[
+            lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False),
+            pruning_callback(trial, metric),
+        ],
+    )
+    trial.set_user_attr("best_iteration", model.best_iteration)
+    return model
@@ -1,12 +1,27 @@
 from typing import Any, Dict
 
 import optuna
+import polars as pl
+
+from src.features.dataset_cache import DatasetCache, train_valid_datasets
+from src.features.matrix import FeatureMatrix
+from src.features.preprocess import Preprocessor
+from src.features.stats import CategoryStatsCache
+from src.metrics import rmse
+from src.suggest_params.preprocess import (
+    preprocessor_seed,
+    suggest_preprocessor_config,
+)
+from src.suggest_params.pruning import train_with_pruning
 
 
 def suggest_lgb_params(trial: optuna.Trial) -> Dict[str, Any]:
     """
     Suggest parameters for LightGBM model using Optuna trial.
 
+    The number of boosting rounds is not suggested; it is chosen by early
+    stopping (see src.suggest_params.pruning).
+
     Args:
         trial: Optuna trial object
 
@@ -21,9 +36,62 @@ def suggest_lgb_params(trial: optuna.Trial) -> Dict[str, Any]:
         "num_leaves": trial.suggest_int("num_leaves", 10, 100),
         "max_depth": trial.suggest_int("max_depth", -1, 50),
         "learning_rate": trial.suggest_float("learning_rate", 0.01, 0.3, log=True),
-        "n_estimators": trial.suggest_int("n_estimators", 50, 500),
         "min_child_samples": trial.suggest_int("min_child_samples", 5, 100),
         "feature_fraction": trial.suggest_float("feature_fraction", 0.4, 1.0),
         "bagging_fraction": trial.suggest_float("bagging_fraction", 0.4, 1.0),
         "bagging_freq": trial.suggest_int("bagging_freq", 1, 10),
     }
+
+
+def objective(
+    trial: optuna.Trial,
+    train_df: pl.DataFrame,
+    val_df: pl.DataFrame,
+    test_df: pl.DataFrame,
+    stats_cache: CategoryStatsCache | None = None,
+    num_threads: int | None = None,
+    dataset_cache: DatasetCache | None = None,
+) -> float:
+    """
+    Optuna objective of the regression task (validation RMSE, minimized).
+
+    Args:
+        trial: Optuna trial object
+        train_df: Raw training data
+        val_df: Raw validation data
+        test_df: Raw test data
+        stats_cache: Category statistics of train_df shared between trials
+        num_threads: Number of LightGBM threads (LightGBM default if None)
+        dataset_cache: Cache of the constructed LightGBM Datasets
+
+    Returns:
+        float: RMSE on the validation data
+    """
+    # Optunaのトライアルからパラメータを取得
+    lgb_params = suggest_lgb_params(trial)
+    if num_threads is not None:
+        lgb_params["num_threads"] = num_threads
+    preprocessor_config = suggest_preprocessor_config(trial, task="regression")
+
+    # 前処理
+    # ノイズのシードを前処理パラメータから決める（LightGBMのパラメータだけが
+    # 異なるトライアルは同じ特徴量になり、Datasetをキャッシュから再利用できる）
+    preprocessor = Preprocessor(
+        **preprocessor_config.to_dict(),
+        random_state=preprocessor_seed(preprocessor_config),
+    )
+    train_df_preprocessed, val_df_preprocessed, test_df_preprocessed = preprocessor.run(
+        train_df, val_df, test_df, stats_cache=stats_cache
+    )
+
+    # LightGBMモデルの学習と評価
+    train_matrix = FeatureMatrix.from_frame(train_df_preprocessed, label="price")
+    val_matrix = FeatureMatrix.from_frame(val_df_preprocessed, label="price")
+    train_set, val_set = train_valid_datasets(
+        train_matrix, val_matrix, lgb_params, dataset_cache
+    )
+    model = train_with_pruning(trial, lgb_params, train_set, val_set, "rmse")
+
+    # バリデーションセットでの予測と評価
+    val_pred = val_matrix.predict(model)
+    return rmse(val_matrix.label, val_pred)
@@ -0,0 +1,185 @@
+"""
+Parallel execution of the Optuna studies.
+
+Trials run in a pool of worker processes that share one file-backed Optuna
+storage (a journal file, or an RDB URL such as sqlite:///study.db). The raw
+train/val/test frames are written once as uncompressed Arrow IPC files and
+memory-mapped by every worker, so the data is shared through the page cache
+instead of being copied into each process. The workers also share an on-disk
+cache of the constructed LightGBM Datasets, so a trial whose preprocessing
+parameters were already tried (by any worker) skips the Dataset construction.
+"""
+
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Literal
+
+import optuna
+import polars as pl
+
+from src.features.dataset_cache import DatasetCache
+from src.features.stats import CategoryStatsCache
+from src.suggest_params import anomaly_detection, regression
+from src.suggest_params.pruning import create_pruner
+
+Task = Literal["regression", "anomaly_detection"]
+
+OBJECTIVES = {
+    "regression": regression.objective,
+    "anomaly_detection": anomaly_detection.objective,
+}
+DIRECTIONS = {"regression": "minimize", "anomaly_detection": "maximize"}
+
+SPLIT_NAMES = ("train", "val", "test")
+
+
+def create_storage(storage: str | Path) -> optuna.storages.BaseStorage | str:
+    """
+    Open a file-backed Optuna storage shared by several processes.
+
+    Args:
+        storage: Path of a journal file, or an RDB URL (e.g. sqlite:///study.db)
+
+    Returns:
+        optuna.storages.BaseStorage | str: Storage accepted by optuna studies
+    """
+    if "://" in str(storage):
+        return str(storage)
+
+    Path(storage).parent.mkdir(parents=True, exist_ok=True)
+    return optuna.storages.JournalStorage(
+        optuna.storages.journal.JournalFileBackend(str(storage))
+    )
+
+
+def _run_worker(
+    task: Task,
+    study_name: str,
+    storage: str,
+    data_paths: list[str],
+    n_trials: int,
+    num_threads: int,
+    seed: int | None,
+    dataset_cache_dir: str,
+) -> None:
+    # 各ワーカーは共有の IPC ファイルをメモリマップして読む（コピーしない）
+    train_df, val_df, test_df = (
+        pl.read_ipc(path, memory_map=True) for path in data_paths
+    )
+    study = optuna.load_study(
+        study_name=study_name,
+        storage=create_storage(storage),
+        sampler=optuna.samplers.TPESampler(seed=seed),
+        pruner=create_pruner(),
+    )
+    objective = partial(
+        OBJECTIVES[task],
+        train_df=train_df,
+        val_df=val_df,
+        test_df=test_df,
+        stats_cache=CategoryStatsCache(train_df),
+        num_threads=num_threads,
+        dataset_cache=DatasetCache(cache_dir=dataset_cache_dir),
+    )
+    study.optimize(objective, n_trials=n_trials)
+
+
+def run_study(
+    task: Task,
+    train_df: pl.DataFrame,
+    val_df: pl.DataFrame,
+    test_df: pl.DataFrame,
+    n_trials: int,
+    storage: str | Path,
+    study_name: str | None = None,
+    n_workers: int | None = None,
+    seed: int | None = None,
+    dataset_cache_dir: str | Path | None = None,
+) -> optuna.Study:
+    """
+    Run the trials of a task's study across a pool of worker processes.
+
+    The study is created in the storage, or resumed if it already exists.
+    Each worker runs its share of the n_trials trials; the CPU cores are split
+    between the workers, so LightGBM and polars do not oversubscribe them.
+
+    Args:
+        task: "regression" or "anomaly_detection"
+        train_df: Raw training data
+        val_df: Raw validation data
+        test_df: Raw test data
+        n_trials: Total number of trials
+        storage: Path of a journal file, or an RDB URL (e.g. sqlite:///study.db)
+        study_name: Name of the study in the storage (task name if None)
+        n_workers: Number of worker processes (number of CPU cores if None)
+        seed: Seed of the samplers; worker i uses seed + i
+        dataset_cache_dir: Directory of the Dataset cache shared by the workers
+            (a temporary directory removed after the run if None)
+
+    Returns:
+        optuna.Study: The study, with the trials of all the workers
+    """
+    if task not in OBJECTIVES:
+        raise ValueError("task must be either 'regression' or 'anomaly_detection'")
+
+    study_name = study_name or task
+    n_workers = n_workers or os.cpu_count() or 1
+    num_threads = max(1, (os.cpu_count() or 1) // n_workers)
+
+    optuna.create_study(
+        study_name=study_name,
+        storage=create_storage(storage),
+        direction=DIRECTIONS[task],
+        pruner=create_pruner(),
+        load_if_exists=True,
+    )
+
+    trial_counts = [
+        n_trials // n_workers + (i < n_trials % n_workers) for i in range(n_workers)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_paths = []
+        for name, df in zip(SPLIT_NAMES, (train_df, val_df, test_df)):
+            path = Path(tmp_dir) / f"{name}.arrow"
+            df.write_ipc(path, compression="uncompressed")
+            data_paths.append(str(path))
+        if dataset_cache_dir is None:
+            dataset_cache_dir = Path(tmp_dir) / "datasets"
+
+        # Worker processes read the thread count of polars at import time
+        previous_threads = os.environ.get("POLARS_MAX_THREADS")
+        os.environ["POLARS_MAX_THREADS"] = str(num_threads)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=n_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            ) as pool:
+                futures = [
+                    pool.submit(
+                        _run_worker,
+                        task,
+                        study_name,
+                        str(storage),
+                        data_paths,
+                        count,
+                        num_threads,
+                        None if seed is None else seed + i,
+                        str(dataset_cache_dir),
+                    )
+                    for i, count in enumerate(trial_counts)
+                    if count > 0
+                ]
+                for future in futures:
+                    future.result()
+        finally:
+            if previous_threads is None:
+                os.environ.pop("POLARS_MAX_THREADS")
+            else:
+                os.environ["POLARS_MAX_THREADS"] = previous_threads
+
+    return optuna.load_study(study_name=study_name, storage=create_storage(storage))
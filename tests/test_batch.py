@@ -0,0 +1,40 @@
+import polars as pl
+import pytest
+
+from src.scoring.batch import score_file
+
+
+class _Booster:
+    """Booster stand-in: empty inputs never reach prediction."""
+
+    def feature_name(self) -> list[str]:
+        return []
+
+
+@pytest.mark.parametrize(
+    "content, schema",
+    [
+        ("id,state,price\n", {"id": pl.Int64, "prediction": pl.Float64}),
+        ("", {"prediction": pl.Float64}),
+    ],
+)
+def test_empty_csv_writes_typed_output(tmp_path, content, schema):
+    input_path = tmp_path / "listings.csv"
+    input_path.write_text(content)
+    output_path = tmp_path / "predictions.parquet"
+
+    assert score_file(input_path, output_path, None, _Booster()) == 0
+    output = pl.read_parquet(output_path)
+    assert output.height == 0
+    assert output.schema == pl.Schema(schema)
+
+
+def test_empty_parquet_writes_typed_output(tmp_path):
+    input_path = tmp_path / "listings.parquet"
+    pl.DataFrame(schema={"id": pl.Int64, "state": pl.String}).write_parquet(input_path)
+    output_path = tmp_path / "predictions.parquet"
+
+    assert score_file(input_path, output_path, None, _Booster()) == 0
+    assert pl.read_parquet(output_path).schema == pl.Schema(
+        {"id": pl.Int64, "prediction": pl.Float64}
+    )
@@ -0,0 +1,107 @@
+import lightgbm as lgb
+import numpy as np
+import optuna
+import pytest
+
+from src.config.preprocess import PreprocessorConfig
+from src.data.synthetic import generate_splits
+from src.features.dataset_cache import DatasetCache, train_valid_datasets
+from src.features.matrix import FeatureMatrix
+from src.features.preprocess import Preprocessor
+from src.suggest_params import anomaly_detection, regression
+
+PARAMS = {
+    "objective": "regression",
+    "verbosity": -1,
+    "num_threads": 1,
+    "num_leaves": 15,
+    "min_data_in_leaf": 50,
+    "max_bin": 63,
+}
+
+
+@pytest.fixture(scope="module")
+def splits():
+    return generate_splits(5_000, seed=0)
+
+
+@pytest.fixture(scope="module")
+def matrices(splits):
+    train_df, val_df, _ = Preprocessor(
+        **PreprocessorConfig().to_dict(), random_state=0
+    ).run(*splits)
+    return (
+        FeatureMatrix.from_frame(train_df, label="price"),
+        FeatureMatrix.from_frame(val_df, label="price"),
+    )
+
+
+def _predict(matrices, cache):
+    train_set, val_set = train_valid_datasets(*matrices, PARAMS, cache)
+    model = lgb.train(PARAMS, train_set, num_boost_round=30, valid_sets=[val_set])
+    return matrices[1].predict(model)
+
+
+def test_cached_datasets_train_the_same_model(matrices, tmp_path):
+    expected = _predict(matrices, None)
+
+    cache = DatasetCache(cache_dir=tmp_path)
+    np.testing.assert_array_equal(_predict(matrices, cache), expected)
+    # memory hit, then the binary files read by a fresh cache
+    np.testing.assert_array_equal(_predict(matrices, cache), expected)
+    np.testing.assert_array_equal(
+        _predict(matrices, DatasetCache(cache_dir=tmp_path)), expected
+    )
+
+
+@pytest.mark.parametrize(
+    "objective, direction",
+    [(regression.objective, "minimize"), (anomaly_detection.objective, "maximize")],
+)
+def test_objective_does_not_depend_on_the_cache(splits, objective, direction):
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    values = []
+    for dataset_cache in (None, DatasetCache()):
+        study = optuna.create_study(
+            direction=direction, sampler=optuna.samplers.RandomSampler(seed=0)
+        )
+        study.optimize(
+            lambda trial: objective(
+                trial, *splits, num_threads=1, dataset_cache=dataset_cache
+            ),
+            n_trials=1,
+        )
+        values.append(study.best_value)
+    assert values[0] == values[1]
+
+
+def test_trials_with_the_same_preprocessing_reuse_datasets(splits, tmp_path):
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = optuna.create_study(sampler=optuna.samplers.RandomSampler(seed=0))
+    cache = DatasetCache(cache_dir=tmp_path)
+
+    def objective(trial):
+        return regression.objective(trial, *splits, num_threads=1, dataset_cache=cache)
+
+    study.optimize(objective, n_trials=1)
+    params = study.trials[0].params
+    for learning_rate in (0.05, 0.2):
+        study.enqueue_trial({**params, "learning_rate": learning_rate})
+    study.optimize(objective, n_trials=2)
+
+    # train and validation Datasets, built once
+    assert len(list(tmp_path.glob("*.bin"))) == 2
+
+
+def test_cache_dir_is_bounded(matrices, tmp_path):
+    cache = DatasetCache(cache_dir=tmp_path)
+    cache.get(matrices[0], PARAMS)
+    size = cache.size()
+
+    # Room for one file only: older files are evicted, the newest is kept
+    small = DatasetCache(cache_dir=tmp_path, max_bytes=size)
+    for max_bin in (15, 31, 127):
+        params = {**PARAMS, "max_bin": max_bin}
+        small.get(matrices[0], params)
+    files = list(tmp_path.glob("*.bin"))
+    assert [path.stem for path in files] == [small.key(matrices[0], params)]
@@ -0,0 +1,66 @@
+from polars.testing import assert_frame_equal
+
+from src.config.preprocess import PreprocessorConfig
+from src.data.synthetic import generate_splits
+from src.features.preprocess import Preprocessor
+from src.pipeline import (
+    Pipeline,
+    filter_stage,
+    fit_encoders_stage,
+    transform_stage,
+)
+
+N_ROWS = 5_000
+
+
+def _add_features(pipeline: Pipeline, prefix: str, config: PreprocessorConfig) -> str:
+    pipeline.add(f"{prefix}_filtered", filter_stage, "data", config=config)
+    pipeline.add(
+        f"{prefix}_encoders",
+        fit_encoders_stage,
+        f"{prefix}_filtered",
+        config=config,
+        random_state=0,
+    )
+    return pipeline.add(
+        f"{prefix}_features",
+        transform_stage,
+        f"{prefix}_encoders",
+        f"{prefix}_filtered",
+    )
+
+
+def _features(config: PreprocessorConfig):
+    pipeline = Pipeline()
+    pipeline.add("data", generate_splits, n_rows=N_ROWS)
+    name = _add_features(pipeline, "model", config)
+    return pipeline.run(name)[name]
+
+
+def test_pipelines_with_the_same_config_give_the_same_features():
+    config = PreprocessorConfig()
+    for frame, expected in zip(_features(config), _features(config)):
+        assert_frame_equal(frame, expected, check_exact=True)
+
+
+def test_features_match_preprocessor_run():
+    config = PreprocessorConfig()
+    expected = Preprocessor(**config.to_dict(), random_state=0).run(
+        *generate_splits(N_ROWS)
+    )
+    for frame, expected_frame in zip(_features(config), expected):
+        assert_frame_equal(frame, expected_frame, check_exact=True)
+
+
+def test_branches_with_the_same_config_share_their_preprocessing():
+    pipeline = Pipeline(n_jobs=2)
+    pipeline.add("data", generate_splits, n_rows=N_ROWS)
+    regression = _add_features(pipeline, "regression", PreprocessorConfig())
+    anomaly = _add_features(pipeline, "anomaly_detection", PreprocessorConfig())
+
+    results = pipeline.run(regression, anomaly)
+
+    assert pipeline.key(regression) == pipeline.key(anomaly)
+    assert len(pipeline.history) == 4
+    for frame, expected in zip(results[regression], results[anomaly]):
+        assert_frame_equal(frame, expected, check_exact=True)
@@ -0,0 +1,48 @@
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+from src.features import preprocess_cache
+from src.features.preprocess_cache import code_version
+
+SRC_DIR = Path(preprocess_cache.__file__).resolve().parents[1]
+
+
+def test_code_version_covers_every_module_the_preprocessor_imports():
+    modules = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys, src.features.preprocess;"
+            "print('\\n'.join(m.__file__ for n, m in sys.modules.items()"
+            " if n.startswith('src.') and getattr(m, '__file__', None)))",
+        ],
+        cwd=SRC_DIR.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.split()
+
+    source_dirs = set(preprocess_cache._SOURCE_DIRS)
+    assert modules
+    assert {Path(module).resolve().parent for module in modules} <= source_dirs
+
+
+def test_code_version_changes_with_the_data_modules(tmp_path, monkeypatch):
+    source_dirs = []
+    for source_dir in preprocess_cache._SOURCE_DIRS:
+        copy = tmp_path / source_dir.name
+        shutil.copytree(source_dir, copy, ignore=shutil.ignore_patterns("__pycache__"))
+        source_dirs.append(copy)
+    monkeypatch.setattr(preprocess_cache, "_SOURCE_DIRS", source_dirs)
+
+    code_version.cache_clear()
+    try:
+        before = code_version()
+        with (tmp_path / "data" / "schema.py").open("a") as f:
+            f.write("\n# changed\n")
+        code_version.cache_clear()
+        assert code_version() != before
+    finally:
+        code_version.cache_clear()
@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from polars.testing import assert_frame_equal
+
+from src.config.preprocess import PreprocessorConfig
+from src.data.synthetic import generate_splits
+from src.features.preprocess import Preprocessor
+
+
+@pytest.fixture(scope="module")
+def splits():
+    return generate_splits(5_000, seed=0)
+
+
+def _preprocessor(**kwargs) -> Preprocessor:
+    return Preprocessor(**PreprocessorConfig().to_dict(), random_state=0, **kwargs)
+
+
+def test_noise_does_not_depend_on_earlier_transforms(splits):
+    train_df, val_df, test_df = splits
+    preprocessor = _preprocessor()
+    _, _, expected = preprocessor.run(train_df, val_df, test_df)
+
+    for _ in range(2):
+        preprocessor.transform(val_df, split="val")
+        assert_frame_equal(
+            preprocessor.transform(test_df, split="test"), expected, check_exact=True
+        )
+
+
+def test_noise_differs_between_splits(splits):
+    train_df, _, _ = splits
+    preprocessor = _preprocessor().fit(train_df)
+    assert not preprocessor.transform(train_df, split="train").equals(
+        preprocessor.transform(train_df, split="test")
+    )
+
+
+def test_noise_does_not_depend_on_n_jobs(splits):
+    expected = _preprocessor().run(*splits)
+    for actual, frame in zip(_preprocessor(n_jobs=4).run(*splits), expected):
+        assert_frame_equal(actual, frame, check_exact=True)
+
+
+def test_loaded_preprocessor_draws_the_same_noise(splits, tmp_path):
+    train_df, _, test_df = splits
+    preprocessor = _preprocessor().fit(train_df)
+    preprocessor.transform(test_df, split="test")
+    preprocessor.save(tmp_path)
+
+    assert_frame_equal(
+        Preprocessor.load(tmp_path).transform(test_df, split="test"),
+        preprocessor.transform(test_df, split="test"),
+        check_exact=True,
+    )
+
+
+def test_concurrent_transforms_draw_the_same_noise(splits):
+    train_df, _, test_df = splits
+    preprocessor = _preprocessor().fit(train_df)
+    expected = preprocessor.transform(test_df, split="test")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        frames = list(
+            executor.map(
+                lambda _: preprocessor.transform(test_df, split="test"), range(8)
+            )
+        )
+    for frame in frames:
+        assert_frame_equal(frame, expected, check_exact=True)
@@ -0,0 +1,111 @@
+import itertools
+
+import numpy as np
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from src.config.preprocess import PreprocessorConfig
+from src.data.synthetic import generate_listings
+from src.features.preprocess import Preprocessor
+from src.features.shards import ShardStats, merge_shard_stats
+from src.features.stats import CategoryStatsCache, column_stats
+
+COLUMNS = ["manufacturer", "state", "fuel"]
+
+
+@pytest.fixture(scope="module")
+def listings():
+    return generate_listings(6_000, seed=0)
+
+
+@pytest.fixture(scope="module")
+def shards(listings):
+    return [listings.slice(offset, 2_000) for offset in (0, 2_000, 4_000)]
+
+
+def _config(**kwargs) -> PreprocessorConfig:
+    config = PreprocessorConfig()
+    for key, value in kwargs.items():
+        setattr(config, key, value)
+    return config
+
+
+def _fitted(config: PreprocessorConfig, fit) -> Preprocessor:
+    preprocessor = Preprocessor(**config.to_dict(), random_state=0)
+    fit(preprocessor)
+    return preprocessor
+
+
+def _encoder_state(preprocessor: Preprocessor) -> dict[str, np.ndarray]:
+    # sum_sq and the median sketch only serve later updates, not the encoding
+    return {
+        key: value
+        for key, value in preprocessor.get_fitted_state().items()
+        if not key.endswith(".sum_sq") and ".sketch." not in key
+    }
+
+
+def assert_same_fit(preprocessor: Preprocessor, expected: Preprocessor, df) -> None:
+    state, expected_state = _encoder_state(preprocessor), _encoder_state(expected)
+    assert state.keys() == expected_state.keys()
+    for key, value in expected_state.items():
+        if value.dtype.kind in "fiu":
+            np.testing.assert_allclose(state[key], value, rtol=1e-12, err_msg=key)
+        else:
+            np.testing.assert_array_equal(state[key], value, err_msg=key)
+    assert_frame_equal(
+        preprocessor.transform(df, add_noise=False),
+        expected.transform(df, add_noise=False),
+    )
+
+
+@pytest.mark.parametrize("median_accuracy", [None, 0.01])
+def test_merged_shards_in_any_order_match_the_whole(listings, shards, median_accuracy):
+    kwargs = dict(
+        columns=COLUMNS,
+        median_columns=["state"],
+        median_accuracy={"state": median_accuracy},
+    )
+    expected = column_stats(listings, **kwargs)
+    for order in itertools.permutations(shards):
+        merged = merge_shard_stats(ShardStats.from_frame(df, **kwargs) for df in order)
+        assert merged.rows == listings.height
+        stats = merged.column_stats()
+        for col in COLUMNS:
+            assert_frame_equal(stats[col], expected[col], check_dtypes=False)
+
+
+def test_merge_rejects_statistics_of_other_columns(shards):
+    with pytest.raises(ValueError, match="different columns"):
+        ShardStats.from_frame(shards[0], ["state"]).merge(
+            ShardStats.from_frame(shards[1], ["fuel"])
+        )
+
+
+FITS = {
+    "fit_shards": lambda shards: lambda p: p.fit_shards(shards, n_workers=1),
+    "fit_shards_in_processes": lambda shards: lambda p: p.fit_shards(
+        shards, n_workers=2
+    ),
+    "lazy": lambda shards: lambda p: p.fit(pl.concat(shards).lazy()),
+    "partial_fit": lambda shards: lambda p: [p.partial_fit(df) for df in shards],
+    "stats_cache": lambda shards: lambda p: p.fit(
+        None, stats_cache=CategoryStatsCache(pl.concat(shards))
+    ),
+}
+
+
+@pytest.mark.parametrize("fit", FITS)
+@pytest.mark.parametrize(
+    "config",
+    [
+        _config(),
+        _config(price_lower_bound=0, price_upper_bound=float("inf")),
+        _config(price_lower_bound=30_000, price_upper_bound=30_000),
+    ],
+    ids=["default", "no_outliers", "empty_window"],
+)
+def test_fits_match_a_direct_fit(listings, shards, fit, config):
+    expected = _fitted(config, lambda p: p.fit(listings))
+    assert_same_fit(_fitted(config, FITS[fit](shards)), expected, listings)
@@ -0,0 +1,137 @@
+import numpy as np
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from src.data.synthetic import generate_listings
+from src.features.stats import (
+    CategoryStatsCache,
+    category_stats,
+    column_stats,
+    merge_stats,
+    price_window_expr,
+)
+
+COLUMNS = ["manufacturer", "state", "fuel"]
+
+
+@pytest.fixture(scope="module")
+def listings():
+    return generate_listings(5_000, seed=0)
+
+
+def _category_stats(df: pl.DataFrame, col: str, **kwargs) -> pl.DataFrame:
+    return category_stats(df.get_column(col), df.get_column("price"), **kwargs)
+
+
+def test_column_stats_matches_category_stats(listings):
+    stats = column_stats(listings, COLUMNS, median_columns=["state"])
+    for col in COLUMNS:
+        assert_frame_equal(
+            stats[col].drop("sum_sq"),
+            _category_stats(listings, col, median=col == "state"),
+            check_dtypes=False,
+        )
+
+
+def test_column_stats_of_a_lazy_frame_matches_the_frame(listings):
+    expected = column_stats(listings, COLUMNS, median_columns=["state"])
+    stats = column_stats(listings.lazy(), COLUMNS, median_columns=["state"])
+    for col in COLUMNS:
+        assert_frame_equal(stats[col], expected[col])
+
+
+@pytest.mark.parametrize("median_accuracy", [None, 0.01])
+def test_stats_cache_matches_category_stats(listings, median_accuracy):
+    cache = CategoryStatsCache(listings)
+    for lower, upper in [(1_000, 40_000), (0, float("inf")), (5_000, 20_000)]:
+        window = listings.filter(price_window_expr(lower, upper))
+        assert_frame_equal(
+            cache.get("state", lower, upper, True, median_accuracy),
+            _category_stats(window, "state", median=True)
+            .drop("median")
+            .join(
+                _category_stats(
+                    window,
+                    "state",
+                    median=True,
+                    median_accuracy=median_accuracy,
+                ).select("category", "median"),
+                on="category",
+                nulls_equal=True,
+            ),
+            check_dtypes=False,
+        )
+
+
+@pytest.mark.parametrize("lower, upper", [(0, 0), (30_000, 30_000), (40_000, 1_000)])
+def test_stats_cache_of_an_empty_window(listings, lower, upper):
+    stats = CategoryStatsCache(listings).get("state", lower, upper, median=True)
+    window = listings.filter(price_window_expr(lower, upper))
+    assert stats.is_empty()
+    assert_frame_equal(stats, _category_stats(window, "state", median=True))
+
+
+@pytest.mark.parametrize("median_accuracy", [None, 0.01])
+def test_merged_halves_match_the_whole(listings, median_accuracy):
+    kwargs = dict(median=True, median_accuracy=median_accuracy, mergeable_median=True)
+    first, second = listings.head(2_000), listings.tail(3_000)
+    merged = merge_stats(
+        _category_stats(first, "state", **kwargs),
+        _category_stats(second, "state", **kwargs),
+    )
+    assert_frame_equal(
+        merged, _category_stats(listings, "state", **kwargs), check_dtypes=False
+    )
+
+
+def test_merge_stats_decays_the_accumulated_statistics(listings):
+    first, second = listings.head(2_000), listings.tail(3_000)
+    stats = _category_stats(first, "fuel")
+    batch = _category_stats(second, "fuel")
+    merged = merge_stats(stats, batch, decay=0.5)
+
+    expected = (
+        pl.concat(
+            [
+                stats.with_columns(pl.col("count", "sum").cast(pl.Float64) * 0.5),
+                batch.with_columns(pl.col("count", "sum").cast(pl.Float64)),
+            ]
+        )
+        .group_by("category")
+        .agg(pl.col("count", "sum").sum())
+        .sort("category")
+    )
+    assert_frame_equal(merged, expected)
+
+
+def test_merge_stats_decays_the_sketch_counts(listings):
+    kwargs = dict(median=True, mergeable_median=True)
+    stats = _category_stats(listings.head(2_000), "state", **kwargs)
+    merged = merge_stats(stats, stats.clear(), decay=0.25)
+
+    counts = merged.select(pl.col("sketch").explode().struct.field("count"))
+    expected = stats.select(pl.col("sketch").explode().struct.field("count"))
+    np.testing.assert_array_equal(counts.to_series(), expected.to_series() * 0.25)
+    assert_frame_equal(merged.select("median"), stats.select("median"))
+
+
+@pytest.mark.parametrize("decay", [1.0, 0.9, 0.25])
+def test_mergeable_median_is_the_exact_median(listings, decay):
+    stats = _category_stats(listings, "state", median=True, mergeable_median=True)
+    merged = merge_stats(stats, stats.clear(), decay=decay)
+    expected = _category_stats(listings, "state", median=True)
+    assert_frame_equal(merged.select("median"), expected.select("median"))
+
+
+def test_merge_stats_rejects_a_bare_exact_median(listings):
+    stats = _category_stats(listings, "state", median=True)
+    with pytest.raises(ValueError, match="value counts"):
+        merge_stats(stats, stats)
+
+
+@pytest.mark.parametrize("decay", [0, 1.5])
+def test_merge_stats_rejects_a_decay_outside_the_unit_interval(listings, decay):
+    stats = _category_stats(listings, "fuel")
+    with pytest.raises(ValueError, match="decay"):
+        merge_stats(stats, stats, decay=decay)
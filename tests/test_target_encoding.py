@@ -0,0 +1,11 @@
+import numpy as np
+import polars as pl
+
+from src.features.target_encoding import TargetEncoder
+
+
+def test_encoder_fitted_on_no_rows_encodes_every_category_as_missing():
+    encoder = TargetEncoder(noise_level=0).fit(
+        pl.Series([], dtype=pl.String), pl.Series([], dtype=pl.Float64)
+    )
+    assert np.isnan(encoder.transform(pl.Series(["a", None]))).all()